@@ -0,0 +1,198 @@
+"""
+admission.py
+
+This module implements admission control for face recognition work. Recognition
+jobs go through a bounded queue served by a fixed number of worker threads, so a
+burst of scans is either absorbed or rejected immediately instead of piling up
+threads and memory.
+
+Features:
+- Bounded queue depth, with an additional per-device cap.
+- Round-robin scheduling across devices so one busy scanner cannot starve the rest.
+- Per-job deadlines; jobs that expire while queued are dropped before any encoding starts.
+- Queue depth, shed and expiry counters for reporting.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+ADMISSION_MAX_DEPTH = int(os.getenv('ADMISSION_MAX_DEPTH', 64))
+ADMISSION_MAX_PER_DEVICE = int(os.getenv('ADMISSION_MAX_PER_DEVICE', 4))
+ADMISSION_DEADLINE = float(os.getenv('ADMISSION_DEADLINE', 10))
+ADMISSION_WORKERS = int(os.getenv('ADMISSION_WORKERS', os.cpu_count() or 1))
+
+
+class Server_Busy(Exception):
+    def __init__(self, message: str, retry_after: int = 1) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Deadline_Exceeded(Server_Busy):
+    pass
+
+
+class _Job:
+    __slots__ = ("func", "args", "kwargs", "deadline", "future")
+
+    def __init__(self, func, args, kwargs, deadline: float) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.future = Future()
+
+
+class RecognitionQueue:
+    """
+    A bounded, per-device fair job queue with deadlines.
+
+    Args:
+        max_depth (int): Maximum number of queued jobs across all devices.
+        max_per_device (int): Maximum number of queued jobs for a single device.
+        workers (int): Number of worker threads running jobs.
+        deadline (float): Default number of seconds a job may wait before it is dropped.
+    """
+
+    def __init__(self, max_depth: int = ADMISSION_MAX_DEPTH,
+                 max_per_device: int = ADMISSION_MAX_PER_DEVICE,
+                 workers: int = ADMISSION_WORKERS,
+                 deadline: float = ADMISSION_DEADLINE) -> None:
+        self.max_depth = max_depth
+        self.max_per_device = max_per_device
+        self.workers = workers
+        self.deadline = deadline
+
+        self._devices: OrderedDict[str, deque[_Job]] = OrderedDict()
+        self._depth = 0
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+        self._accepted = 0
+        self._completed = 0
+        self._shed = 0
+        self._expired = 0
+        # Exponentially weighted mean job duration, used for Retry-After.
+        self._service_time = 1.0
+
+    def _start_workers(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker,
+                                      name=f"recognition-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def retry_after(self) -> int:
+        """
+        Estimate how many seconds a rejected client should wait before retrying.
+
+        Returns:
+            int: The suggested delay in seconds.
+        """
+        return max(1, math.ceil(self._depth * self._service_time / self.workers))
+
+    def submit(self, device_id: str, func, *args, deadline: float | None = None, **kwargs) -> Future:
+        """
+        Queue a job for a device.
+
+        Args:
+            device_id (str): Identifier of the device (or client) submitting the job.
+            func (callable): The job to run.
+            deadline (float | None): Seconds the job may wait in the queue.
+            args, kwargs: Arguments passed to `func`.
+
+        Returns:
+            Future: Resolves to the job's return value. It fails with
+            `Deadline_Exceeded` if the job expired before it started.
+
+        Raises:
+            Server_Busy: If the queue, or the device's share of it, is full.
+        """
+        device_id = str(device_id)
+        job = _Job(func, args, kwargs,
+                   time.monotonic() + (self.deadline if deadline is None else deadline))
+        with self._cond:
+            if not self._threads:
+                self._start_workers()
+            pending = self._devices.get(device_id)
+            if self._depth >= self.max_depth or (pending and len(pending) >= self.max_per_device):
+                self._shed += 1
+                raise Server_Busy("Server busy", self.retry_after())
+
+            self._devices.setdefault(device_id, deque()).append(job)
+            self._depth += 1
+            self._accepted += 1
+            self._cond.notify()
+        return job.future
+
+    def run(self, device_id: str, func, *args, **kwargs):
+        """
+        Queue a job and wait for its result.
+
+        Raises:
+            Server_Busy: If the job was rejected or expired in the queue.
+        """
+        return self.submit(device_id, func, *args, **kwargs).result()
+
+    def _next_job(self) -> _Job:
+        with self._cond:
+            while not self._depth:
+                self._cond.wait()
+            # Take one job from the device at the front, then move that device
+            # to the back so every device gets a turn.
+            device_id, pending = next(iter(self._devices.items()))
+            job = pending.popleft()
+            if pending:
+                self._devices.move_to_end(device_id)
+            else:
+                del self._devices[device_id]
+            self._depth -= 1
+            return job
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if time.monotonic() > job.deadline:
+                with self._cond:
+                    self._expired += 1
+                job.future.set_exception(
+                    Deadline_Exceeded("Job expired in queue", self.retry_after()))
+                continue
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            started = time.monotonic()
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            with self._cond:
+                self._completed += 1
+                self._service_time = 0.8 * self._service_time + \
+                    0.2 * (time.monotonic() - started)
+
+    def stats(self) -> dict:
+        """
+        Report queue depth and admission counters.
+
+        Returns:
+            dict: Current depth, limits and counters.
+        """
+        with self._cond:
+            return {
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "devices_waiting": len(self._devices),
+                "workers": self.workers,
+                "accepted": self._accepted,
+                "completed": self._completed,
+                "shed": self._shed,
+                "expired": self._expired,
+                "mean_service_time": round(self._service_time, 4),
+            }
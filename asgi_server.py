@@ -0,0 +1,739 @@
+"""
+asgi_server.py
+
+This module implements an asyncio-based ASGI application serving the `/command`
+WebSocket endpoint. It is an alternative to the Flask server for deployments with
+many ESP32 devices: an idle connection is a suspended coroutine instead of a
+blocked thread, so thousands of devices can stay connected to one process.
+
+Features:
+- The same command set as `server.py` (`enroll_face`, `verify_face`, `enroll_user`,
+  `start_class`, `log_attendance`).
+- Blocking database work runs on a thread pool sized to the face_app connection pool.
+- CPU-bound image decoding and face encoding run on a process pool.
+- Pipelined binary frames (see `protocol.py`) alongside the legacy two-message commands.
+
+Usage:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000 --ws-ping-interval 15
+
+Dependencies:
+- uvicorn (or any other ASGI server)
+- face_recognition
+- psycopg2
+- OpenCV (cv2)
+- PIL (Pillow)
+"""
+
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import admission
+import capture_cache
+import face_app
+import protocol
+
+ASGI_ENCODE_WORKERS = int(os.getenv('ASGI_ENCODE_WORKERS', os.cpu_count() or 1))
+ASGI_DB_WORKERS = int(os.getenv('ASGI_DB_WORKERS', face_app.DB_POOL_MAX))
+
+# Created on lifespan startup so that importing this module (which the
+# process pool workers do) has no side effects.
+_encode_executor: ProcessPoolExecutor | None = None
+_db_executor: ThreadPoolExecutor | None = None
+
+# Recognition jobs are admitted through a bounded queue whose workers hand
+# the encoding to the process pool, so the queue also caps encode concurrency.
+recognition_queue = admission.RecognitionQueue(workers=ASGI_ENCODE_WORKERS)
+
+# Scan captures, sharded per day and pruned in the background.
+captures = capture_cache.CaptureCache(is_referenced=face_app.referenced_images)
+
+
+class Connection_Closed(Exception):
+    pass
+
+
+class AsyncWebSocket:
+    """
+    Minimal wrapper over the ASGI WebSocket messages with the same
+    `receive`/`send` shape as the flask_sock `Server`.
+    """
+
+    def __init__(self, scope, receive, send) -> None:
+        self._receive = receive
+        self._send = send
+        client = scope.get("client")
+        self.remote_addr = client[0] if client else None
+
+    async def accept(self) -> None:
+        message = await self._receive()
+        if message["type"] != "websocket.connect":
+            raise Connection_Closed("Connection closed before handshake")
+        await self._send({"type": "websocket.accept"})
+
+    async def receive(self) -> str | bytes:
+        message = await self._receive()
+        if message["type"] == "websocket.disconnect":
+            raise Connection_Closed("Connection closed")
+        if message.get("text") is not None:
+            return message["text"]
+        return message.get("bytes") or b""
+
+    async def send(self, data: str | bytes | dict) -> None:
+        if isinstance(data, (bytes, bytearray)):
+            await self._send({"type": "websocket.send", "bytes": bytes(data)})
+            return
+        if isinstance(data, dict):
+            data = json.dumps(data)
+        await self._send({"type": "websocket.send", "text": data})
+
+
+def _decode_image(data: bytes) -> np.ndarray:
+    image = Image.open(BytesIO(data))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def _encode_jpeg(data: bytes) -> np.ndarray:
+    """
+    Decode a JPEG capture and compute its face encoding.
+
+    Runs inside the encode process pool.
+
+    Args:
+        data (bytes): The raw JPEG bytes received from the device.
+
+    Returns:
+        numpy.ndarray: The face encoding.
+    """
+    return face_app.encode_face(_decode_image(data))
+
+
+def _save_image(data: bytes, filename: str) -> None:
+    Image.open(BytesIO(data)).save(filename)
+
+
+def _count_quality_reject(e: face_app.Poor_Capture_Quality) -> None:
+    # The quality gate ran in a pool process, so count its verdict here too.
+    face_app.quality_gate.record(e.reason)
+
+
+def _encode_in_pool(capture: np.ndarray) -> np.ndarray:
+    try:
+        face_embed = _encode_executor.submit(face_app.encode_face, capture).result()
+    except face_app.Poor_Capture_Quality as e:
+        _count_quality_reject(e)
+        raise
+    face_app.quality_gate.record(None)
+    return face_embed
+
+
+def retake_response(e: face_app.Poor_Capture_Quality) -> dict:
+    """
+    Build the response asking the device to retake a capture that failed the quality gate.
+    """
+    return {"status": "RETAKE",
+            "reason": e.reason,
+            "body": f"{e}",
+            "verified": False}
+
+
+def _verify_job(data: bytes, **biodata):
+    """
+    Save, encode and match a capture. Runs on a recognition queue worker.
+    """
+    _save_image(data, biodata["image_filename"])
+    return face_app.login(_decode_image(data), encoder=_encode_in_pool, **biodata)
+
+
+def _identify_job(data: bytes, **biodata):
+    """
+    Save, encode and identify a capture among all enrolled students. Runs on a recognition queue worker.
+    """
+    _save_image(data, biodata["image_filename"])
+    return face_app.identify_face(_decode_image(data), encoder=_encode_in_pool, **biodata)
+
+
+def _group_job(data: bytes, **class_data):
+    """
+    Save a classroom capture and identify every face in it. Runs on a recognition queue worker.
+    """
+    _save_image(data, class_data["image_filename"])
+    return face_app.identify_group(_decode_image(data), **class_data)
+
+
+async def run_encode(func, *args):
+    """Run a CPU-bound callable on the encode process pool."""
+    return await asyncio.get_running_loop().run_in_executor(_encode_executor, func, *args)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking face_app call on the database thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, lambda: func(*args, **kwargs))
+
+
+async def enroll_capture(data: bytes, device_id: str, **biodata) -> dict:
+    """
+    Enroll the face in a JPEG capture.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Returns:
+        dict: The response body.
+    """
+    biodata["image_filename"] = f"./static/enrolled/{biodata.get('matric_no', 'face_to_verify')}_{datetime.strftime(datetime.now(), format='%Y%m%d_%H%M%S')}.jpg"
+    try:
+        face_embed = await run_encode(_encode_jpeg, data)
+        await run_db(face_app.save_face_embedding, face_embed, **biodata)
+
+    except face_app.Poor_Capture_Quality as e:
+        logging.error(f"Poor capture quality: {e.reason}")
+        _count_quality_reject(e)
+        return retake_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected"}
+
+    except face_app.Multiple_Faces_Detected:
+        logging.error("Multiple faces detected")
+        return {"status": "ERR", "body": "Multiple faces detected"}
+
+    except Exception as e:
+        logging.error(f"Error processing user: {e}")
+        return {"status": "ERR", "body": f"{e}"}
+
+    logging.info("Face enrollment successful")
+    await run_db(_save_image, data, biodata["image_filename"])
+    return {"status": "OK",
+            "body": f"{biodata.get('matric_no')} enrolled successfully"}
+
+
+async def verify_capture(data: bytes, device_id: str, **biodata) -> dict:
+    """
+    Verify the face in a JPEG capture through the recognition queue.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Returns:
+        dict: The response body.
+    """
+    biodata["scan_timestamp"] = biodata.get(
+        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    biodata["image_filename"] = captures.path_for(biodata.get('matric_no', 'face_to_verify'))
+    try:
+        verified, matric_no, l2_confidence = await asyncio.wrap_future(
+            recognition_queue.submit(device_id, _verify_job, data, **biodata))
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding scan: {e}")
+        return {"status": "BUSY",
+                "body": "Server busy, try again later.",
+                "retry_after": e.retry_after,
+                "verified": False}
+
+    except face_app.Poor_Capture_Quality as e:
+        logging.error(f"Poor capture quality: {e.reason}")
+        return retake_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected", "verified": False}
+
+    except face_app.Multiple_Faces_Detected:
+        logging.error("Multiple faces detected")
+        return {"status": "ERR", "body": "Multiple faces detected", "verified": False}
+
+    except face_app.User_Not_Registered:
+        logging.error("User not registered")
+        return {"status": "ERR", "body": "User not registered", "verified": False}
+
+    except Exception as e:
+        logging.error(f"Error processing image: {e}")
+        return {"status": "ERR", "body": "Invalid image data."}
+
+    logging.info(f"Face verification successful for {matric_no}")
+    return {"status": "OK" if verified else "ERR",
+            "body": f"{matric_no}",
+            "verified": verified}
+
+
+async def identify_capture(data: bytes, device_id: str, **biodata) -> dict:
+    """
+    Identify the face in a JPEG capture among all enrolled students through the recognition queue.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        biodata (dict): Optional `k`, `ef_search` and `probes`, and details for logging.
+
+    Returns:
+        dict: The response body, with the top-k candidates closest first.
+    """
+    biodata["scan_timestamp"] = biodata.get(
+        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    biodata["image_filename"] = captures.path_for('identify')
+    try:
+        candidates = await asyncio.wrap_future(
+            recognition_queue.submit(device_id, _identify_job, data, **biodata))
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding identification: {e}")
+        return {"status": "BUSY",
+                "body": "Server busy, try again later.",
+                "retry_after": e.retry_after,
+                "verified": False}
+
+    except face_app.Poor_Capture_Quality as e:
+        logging.error(f"Poor capture quality: {e.reason}")
+        return retake_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected", "verified": False}
+
+    except face_app.Multiple_Faces_Detected:
+        logging.error("Multiple faces detected")
+        return {"status": "ERR", "body": "Multiple faces detected", "verified": False}
+
+    except face_app.User_Not_Registered:
+        logging.error("No enrolled faces")
+        return {"status": "ERR", "body": "User not registered", "verified": False}
+
+    except Exception as e:
+        logging.error(f"Error identifying image: {e}")
+        return {"status": "ERR", "body": f"{e}", "verified": False}
+
+    best = candidates[0]
+    return {"status": "OK" if best["verified"] else "ERR",
+            "body": best["matric_no"],
+            "verified": best["verified"],
+            "candidates": candidates}
+
+
+async def identify_group_capture(data: bytes, device_id: str, **class_data) -> dict:
+    """
+    Identify every face in a classroom capture through the recognition queue.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        class_data (dict): Optional `class_id` (defaults to the current class).
+
+    Returns:
+        dict: The response body, with one entry per detected face.
+    """
+    class_data["scan_timestamp"] = class_data.get(
+        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    class_data["image_filename"] = captures.path_for(
+        f"group_{class_data.get('class_id', face_app.current_class_id)}")
+    try:
+        faces = await asyncio.wrap_future(
+            recognition_queue.submit(device_id, _group_job, data, **class_data))
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding group capture: {e}")
+        return {"status": "BUSY",
+                "body": "Server busy, try again later.",
+                "retry_after": e.retry_after}
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected"}
+
+    except Exception as e:
+        logging.error(f"Error processing group capture: {e}")
+        return {"status": "ERR", "body": f"{e}"}
+
+    identified = sum(face["verified"] for face in faces)
+    return {"status": "OK",
+            "body": f"{identified} of {len(faces)} faces identified",
+            "faces": faces}
+
+
+async def enroll_face(ws: AsyncWebSocket, **biodata):
+    """
+    Enroll a user's face by receiving an image via WebSocket.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Sends:
+        JSON response indicating success or error.
+    """
+    logging.info("Enrolling face...")
+    data = await ws.receive()
+    if not isinstance(data, bytes):
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": "Invalid data type."}))
+        return
+
+    device_id = biodata.pop("device_id", ws.remote_addr)
+    await ws.send(json.dumps(await enroll_capture(data, device_id, **biodata)))
+
+
+async def verify_face(ws: AsyncWebSocket, **biodata):
+    """
+    Verify a user's face by matching it against the database.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Sends:
+        JSON response indicating success or error.
+    """
+    logging.info("Verifying face...")
+    data = await ws.receive()
+    if not isinstance(data, bytes):
+        logging.error("Invalid data type received")
+        await ws.send(json.dumps({"status": "error",
+                                  "body": "Invalid data type."}))
+        return
+
+    device_id = biodata.pop("device_id", ws.remote_addr)
+    await ws.send(json.dumps(await verify_capture(data, device_id, **biodata)))
+
+
+async def identify_face(ws: AsyncWebSocket, **biodata):
+    """
+    Identify a face among all enrolled students, without a matriculation number.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        biodata (dict): Optional `k`, `ef_search` and `probes`, and details for logging.
+
+    Sends:
+        JSON response with the best match and the top-k candidates.
+    """
+    logging.info("Identifying face...")
+    data = await ws.receive()
+    if not isinstance(data, bytes):
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": "Invalid data type."}))
+        return
+
+    device_id = biodata.pop("device_id", ws.remote_addr)
+    await ws.send(json.dumps(await identify_capture(data, device_id, **biodata)))
+
+
+async def group_capture(ws: AsyncWebSocket, **class_data):
+    """
+    Take attendance for a whole class from one classroom capture received via WebSocket.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        class_data (dict): Optional `class_id` (defaults to the current class).
+
+    Sends:
+        JSON response with the identified faces and their bounding boxes.
+    """
+    logging.info("Identifying classroom capture...")
+    data = await ws.receive()
+    if not isinstance(data, bytes):
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": "Invalid data type."}))
+        return
+
+    device_id = class_data.pop("device_id", ws.remote_addr)
+    await ws.send(json.dumps(await identify_group_capture(data, device_id, **class_data)))
+
+
+async def enroll_user(ws: AsyncWebSocket, **biodata):
+    """
+    Enroll a new user without face data.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Sends:
+        JSON response indicating success or error.
+    """
+    logging.info(f"Enrolling user {biodata.get('matric_no')}...")
+    try:
+        await run_db(face_app.register_new_user, face_flag=False, **biodata)
+    except face_app.Invalid_Username:
+        logging.error("Invalid username")
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": "Invalid username"}))
+    except Exception as e:
+        logging.error(f"Error enrolling user: {e}")
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": f"{e}"}))
+    else:
+        await ws.send(json.dumps({"status": "OK",
+                                  "body": f"{biodata.get('matric_no')} enrolled successfully"}))
+
+
+async def start_class(ws: AsyncWebSocket, **class_data) -> None:
+    """
+    Start a new class session and log its details in the database.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        class_data (dict): Details of the class including course code, venue, and start time.
+
+    Sends:
+        JSON response indicating success or error.
+    """
+    try:
+        logging.info("Starting class...")
+        class_id = await run_db(face_app.log_class_details, class_data)
+    except Exception as e:
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": f"Error starting class: {e}"}))
+    else:
+        await ws.send(json.dumps({"status": "OK",
+                                  "body": f"Class {class_id} started successfully"}))
+
+
+async def log_attendance(ws: AsyncWebSocket, **attendance_data):
+    """
+    Log attendance for a class session.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        attendance_data (dict): Attendance details including matriculation number and verification status.
+
+    Sends:
+        JSON response indicating success or error.
+    """
+    logging.info("Logging attendance...")
+    try:
+        await run_db(face_app.log, **attendance_data)
+    except Exception as e:
+        logging.error(f"Error logging attendance: {e}")
+        await ws.send(json.dumps({"status": "ERR",
+                                  "body": f"Error logging attendance: {e}"}))
+    else:
+        logging.info("Attendance logged successfully")
+        await ws.send(json.dumps({"status": "OK",
+                                  "body": "Attendance logged successfully"}))
+
+
+operations = {
+    "enroll_face": enroll_face,
+    "verify_face": verify_face,
+    "identify_face": identify_face,
+    "group_capture": group_capture,
+    "enroll_user": enroll_user,
+    "start_class": start_class,
+    "log_attendance": log_attendance
+}
+
+# Commands that carry an image. In a frame they run as their own task, so a
+# device can keep several of them in flight.
+framed_operations = {
+    "enroll_face": enroll_capture,
+    "verify_face": verify_capture,
+    "identify_face": identify_capture,
+    "group_capture": identify_group_capture,
+}
+
+
+class _FramedSocket:
+    """
+    Tags every response sent by a command with the request id of its frame.
+    """
+
+    def __init__(self, ws: AsyncWebSocket, rid) -> None:
+        self.ws = ws
+        self.rid = rid
+
+    async def receive(self):
+        raise protocol.Invalid_Frame("Framed commands cannot wait for another message")
+
+    async def send(self, data) -> None:
+        await self.ws.send(protocol.tag_response(data, self.rid))
+
+
+async def _answer_frame(ws: AsyncWebSocket, rid, response) -> None:
+    try:
+        await ws.send(protocol.tag_response(await response, rid))
+    except Connection_Closed:
+        pass
+
+
+async def handle_frame(ws: AsyncWebSocket, data: bytes, pending: set) -> None:
+    """
+    Dispatch a framed command.
+
+    Image commands are started as tasks and answered when they finish; the
+    others run before the next message is read.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+        data (bytes): The frame.
+        pending (set): The connection's in-flight tasks.
+
+    Raises:
+        protocol.Invalid_Frame: If the frame is malformed.
+    """
+    header, payload = protocol.decode_frame(data)
+    rid = header.pop("rid")
+    operation = header.pop("cmd")
+    logging.info({"parsed_frame": header, "cmd": operation, "rid": rid})
+
+    if operation in framed_operations:
+        device_id = header.pop("device_id", ws.remote_addr)
+        task = asyncio.create_task(_answer_frame(
+            ws, rid, framed_operations[operation](payload, device_id, **header)))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    elif operation in operations:
+        await operations[operation](_FramedSocket(ws, rid), **header)
+    else:
+        await ws.send(protocol.tag_response({"status": "ERR",
+                                             "body": "Invalid command."}, rid))
+
+
+async def command(ws: AsyncWebSocket):
+    """
+    WebSocket endpoint to handle the same commands as `server.command`.
+
+    Args:
+        ws (AsyncWebSocket): The WebSocket connection.
+    """
+    logging.info("WebSocket connection established.")
+    pending: set[asyncio.Task] = set()
+    try:
+        while True:
+            data = await ws.receive()
+            try:
+                if isinstance(data, str):
+                    json_data: dict = json.loads(data)
+                    logging.info({"parsed_data": json_data})
+
+                    operation: str = json_data.pop("cmd", None)
+                    if operation in operations:
+                        await operations[operation](ws, **json_data)
+                    else:
+                        await ws.send(json.dumps({"status": "ERR",
+                                                  "body": "Invalid command."}))
+
+                elif protocol.is_frame(data):
+                    await handle_frame(ws, data, pending)
+
+                else:
+                    await ws.send(json.dumps({"status": "ERR",
+                                              "body": "Unsupported data type."}))
+            except json.JSONDecodeError as e:
+                logging.error(f"JSON decode error: {e}")
+                await ws.send(json.dumps({"status": "ERR",
+                                          "body": "Invalid JSON data."}))
+            except protocol.Invalid_Frame as e:
+                logging.error(f"Invalid frame: {e}")
+                await ws.send(json.dumps({"status": "ERR",
+                                          "body": f"Invalid frame: {e}"}))
+            except Connection_Closed:
+                raise
+            except Exception as e:
+                logging.error(f"Error processing data: {e}")
+                await ws.send(json.dumps({"status": "ERR",
+                                          "body": str(e)}))
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def startup() -> None:
+    global _encode_executor, _db_executor
+    _encode_executor = ProcessPoolExecutor(max_workers=ASGI_ENCODE_WORKERS)
+    _db_executor = ThreadPoolExecutor(max_workers=ASGI_DB_WORKERS,
+                                      thread_name_prefix="face_app-db")
+    face_app.start_warmup()
+    for _ in range(ASGI_ENCODE_WORKERS):
+        _encode_executor.submit(face_app.warmup)
+
+
+def shutdown() -> None:
+    if _encode_executor is not None:
+        _encode_executor.shutdown(wait=False, cancel_futures=True)
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _respond(send, status: int, body: bytes, content_type: bytes = b"text/plain") -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def stats() -> dict:
+    """
+    Report runtime statistics for the recognition pipeline.
+
+    Returns:
+        dict: Queue depth, shed counts, cache hit rates, quality gate rejects
+        and capture cache size.
+    """
+    return {"admission": recognition_queue.stats(),
+            "frame_cache": face_app.result_cache.stats(),
+            "verified": face_app.verified_stats(),
+            "quality": face_app.quality_gate.stats(),
+            "capture_cache": captures.stats()}
+
+
+async def app(scope, receive, send) -> None:
+    """
+    The ASGI application.
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+
+    elif scope["type"] == "websocket" and scope["path"] == "/command":
+        ws = AsyncWebSocket(scope, receive, send)
+        try:
+            await ws.accept()
+            await command(ws)
+        except Connection_Closed:
+            logging.info("WebSocket connection closed.")
+
+    elif scope["type"] == "websocket":
+        await send({"type": "websocket.close", "code": 1008})
+
+    elif scope["type"] == "http" and scope["path"] == "/ready":
+        status = {"models": face_app.models_ready(),
+                  "database": await run_db(face_app.database_ready)}
+        status["ready"] = status["models"] and status["database"]
+        await _respond(send, 200 if status["ready"] else 503,
+                       json.dumps(status).encode(), b"application/json")
+
+    elif scope["type"] == "http" and scope["path"] == "/stats":
+        await _respond(send, 200, json.dumps(stats()).encode(), b"application/json")
+
+    else:
+        await _respond(send, 404, b"Not Found")
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
@@ -0,0 +1,83 @@
+"""
+bench_detectors.py
+
+Benchmark of the face detector backends in `detectors.py` on the same sample
+set: detection latency per frame, miss rate (frames where no face was found) and
+the rate of frames with more faces than expected (usually false positives).
+
+Usage:
+    python benchmarks/bench_detectors.py --samples ./samples --backends hog,haar,dnn
+
+`--samples` is a directory of JPEG captures with `--faces` faces each (one by
+default, like the kiosk and device captures). Backends that cannot be loaded
+(e.g. `dnn` without its model files) are reported and skipped.
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+
+import detectors  # noqa: E402
+
+
+def load_samples(directory: str) -> list:
+    paths = sorted(glob.glob(os.path.join(directory, "*.jp*g")))
+    if not paths:
+        raise SystemExit(f"No JPEG samples found in {directory}")
+    # BGR, like the frames face_app gets from the servers and the kiosk camera.
+    return [cv2.imread(path) for path in paths]
+
+
+def percentile(timings: list[float], pct: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * pct / 100))]
+
+
+def bench(detector: detectors.Detector, samples: list, faces: int, repeat: int) -> None:
+    try:
+        detector.warmup()
+    except Exception as e:
+        print(f"{detector.name:<6} skipped: {e}")
+        return
+
+    timings, missed, extra = [], 0, 0
+    for capture in samples:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            boxes = detector.detect(capture)
+            timings.append((time.perf_counter() - started) * 1000)
+        missed += len(boxes) == 0
+        extra += len(boxes) > faces
+
+    timings.sort()
+    print(f"{detector.name:<6} mean={statistics.mean(timings):.1f}ms "
+          f"p50={percentile(timings, 50):.1f}ms p95={percentile(timings, 95):.1f}ms "
+          f"miss={missed / len(samples):.1%} extra={extra / len(samples):.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--samples", required=True, help="Directory of JPEG face captures.")
+    parser.add_argument("--backends", default=",".join(detectors.DETECTORS),
+                        help="Comma-separated backends to compare.")
+    parser.add_argument("--faces", type=int, default=1, help="Faces in each sample.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per sample.")
+    parser.add_argument("--max-width", type=int, default=detectors.FACE_DETECTOR_MAX_WIDTH,
+                        help="Scale frames down to this width before detection; 0 disables.")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    print(f"{len(samples)} samples, {args.repeat} runs each, max width {args.max_width or 'off'}")
+    for name in args.backends.split(","):
+        bench(detectors.get_detector(name.strip(), max_width=args.max_width),
+              samples, args.faces, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+bench_import.py
+
+Import-time budget for the application modules. Each module is imported in a
+fresh interpreter several times and the median wall time is compared with its
+budget; the script exits non-zero if any module is over budget, so it can gate
+changes that slow down cold starts and worker respawns.
+
+Usage:
+    python benchmarks/bench_import.py --runs 5
+
+Budgets (milliseconds) can be overridden with IMPORT_BUDGET_<MODULE>, e.g.
+IMPORT_BUDGET_SERVER=1500. Pass --importtime to print the slowest imports
+reported by `python -X importtime` for each module.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing must not connect to the database or load the dlib models.
+DEFAULT_BUDGETS_MS = {
+    "face_app": 800,
+    "server": 1500,
+    "asgi_server": 1000,
+}
+
+
+def time_import(module: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def slowest_imports(module: str, count: int = 10) -> list[str]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, check=True, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return [f"{cumulative / 1000:8.1f}ms {name}" for cumulative, name in sorted(rows, reverse=True)[:count]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_BUDGETS_MS))
+    args = parser.parse_args()
+
+    # Interpreter start-up is not part of any module's budget.
+    baseline = statistics.median(time_import("sys") for _ in range(args.runs))
+
+    over_budget = False
+    for module in args.modules:
+        budget = float(os.getenv(f"IMPORT_BUDGET_{module.upper()}",
+                                 DEFAULT_BUDGETS_MS.get(module, 1000)))
+        elapsed = statistics.median(time_import(module) for _ in range(args.runs)) - baseline
+        verdict = "ok" if elapsed <= budget else "OVER BUDGET"
+        over_budget |= elapsed > budget
+        print(f"{module:<12} {elapsed:8.1f}ms (budget {budget:.0f}ms) {verdict}")
+        if args.importtime:
+            for line in slowest_imports(module):
+                print(f"    {line}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
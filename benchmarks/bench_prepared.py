@@ -0,0 +1,91 @@
+"""
+bench_prepared.py
+
+Benchmark of the hot-path lookup in `face_app.match_face`: plain `cursor.execute`
+with client-side interpolation against the server-side prepared statement from
+`statements.py`. Both variants run on the same connection with the same random
+embedding, and only the query round trip is timed.
+
+Usage:
+    python benchmarks/bench_prepared.py --matric-no 20210001 --iterations 2000
+
+Reads the database settings from the same `.env` as the application.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+import statements  # noqa: E402
+
+MATCH_FACE_SQL = """
+    SELECT id, matric_no, SQRT(face_embed <-> %s) AS l2_confidence FROM public.students_biodata
+    WHERE matric_no = %s
+    ORDER BY l2_confidence ASC
+    LIMIT 1;
+    """
+
+
+def time_queries(run_query, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run_query()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<12} mean={statistics.mean(timings):.3f}ms "
+          f"p50={statistics.median(timings):.3f}ms p99={p99:.3f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--matric-no", required=True,
+                        help="An enrolled matric number to match against.")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = psycopg2.connect(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        connection_factory=statements.PreparingConnection,
+    )
+    cursor = conn.cursor()
+    embed = repr([random.uniform(-0.2, 0.2) for _ in range(128)])
+    params = (embed, args.matric_no)
+
+    def plain():
+        cursor.execute(MATCH_FACE_SQL, params)
+        cursor.fetchone()
+
+    def prepared():
+        statements.MATCH_FACE.execute(cursor, params)
+        cursor.fetchone()
+
+    # Warm up both paths (and prepare the statement) before timing.
+    for run_query in (plain, prepared):
+        time_queries(run_query, 20)
+
+    report("execute", time_queries(plain, args.iterations))
+    report("prepared", time_queries(prepared, args.iterations))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
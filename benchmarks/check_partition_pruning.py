@@ -0,0 +1,165 @@
+"""
+check_partition_pruning.py
+
+Check that `migrations/004_partition_attendance_log.sql` keeps the keys of
+`attendance_log` and that the attendance report reads a single partition. The
+script creates a scratch database, builds a minimal `attendance_log` and
+`classes` with three months of rows, applies the migration, and then runs
+`EXPLAIN` on both report queries from `statements.py` for one day. It exits
+non-zero if any check fails.
+
+Usage:
+    python benchmarks/check_partition_pruning.py --database face_db_pruning_check
+
+Connects with the same `.env` settings as the application. The user must be
+allowed to create databases. The scratch database is dropped afterwards unless
+`--keep` is given.
+"""
+
+import argparse
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+import statements  # noqa: E402
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "migrations", "004_partition_attendance_log.sql")
+
+# The columns the application uses, with a serial primary key and the indexes
+# of migration 003 and a matric number lookup.
+SCHEMA = """
+    CREATE TABLE public.classes (
+        id SERIAL PRIMARY KEY,
+        course_code TEXT,
+        date DATE
+    );
+    CREATE TABLE public.attendance_log (
+        id SERIAL PRIMARY KEY,
+        matric_no TEXT,
+        class_id INTEGER,
+        level INTEGER,
+        department TEXT,
+        verified BOOLEAN DEFAULT FALSE,
+        scan_timestamp TIMESTAMP,
+        log_timestamp TIMESTAMP,
+        image_url TEXT,
+        confidence DOUBLE PRECISION,
+        idempotency_key TEXT
+    );
+    CREATE UNIQUE INDEX attendance_log_idempotency_key_idx ON public.attendance_log (idempotency_key);
+    CREATE INDEX attendance_log_matric_no_lookup ON public.attendance_log (matric_no);
+
+    INSERT INTO public.classes (course_code, date)
+    SELECT 'CSC' || (n % 5), CURRENT_DATE - n FROM generate_series(0, 90) AS n;
+
+    INSERT INTO public.attendance_log
+    (matric_no, class_id, level, department, verified, scan_timestamp, log_timestamp, confidence)
+    SELECT 'STU' || (n % 200), 91 - (n % 91), 100, 'CSC', n % 3 > 0, t, t, 0.4
+    FROM generate_series(1, 20000) AS n,
+         LATERAL (SELECT CURRENT_DATE - (n % 91) + (n % 86400) * INTERVAL '1 second' AS t) AS ts;
+"""
+
+
+def connect(dbname: str):
+    conn = psycopg2.connect(
+        dbname=dbname,
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+    )
+    conn.autocommit = True
+    return conn
+
+
+def scanned_relations(plan: dict) -> set[str]:
+    relations = set()
+    if "Relation Name" in plan:
+        relations.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        relations |= scanned_relations(child)
+    return relations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--database", default="face_db_pruning_check",
+                        help="Scratch database to create (and drop).")
+    parser.add_argument("--admin-database", default="postgres",
+                        help="Existing database to connect to for CREATE/DROP DATABASE.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    admin = connect(args.admin_database)
+    with admin.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS "{args.database}"')
+        cursor.execute(f'CREATE DATABASE "{args.database}"')
+
+    failures = []
+
+    def check(name: str, ok: bool, detail: str) -> None:
+        print(f"{'PASS' if ok else 'FAIL'} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        conn = connect(args.database)
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA)
+            with open(MIGRATION) as f:
+                cursor.execute(f.read())
+            cursor.execute("ANALYZE")
+
+            cursor.execute("""
+                SELECT array_agg(a.attname::text ORDER BY a.attname)
+                FROM pg_index i
+                INNER JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = 'public.attendance_log'::regclass AND i.indisprimary
+                """)
+            primary_key = cursor.fetchone()[0] or []
+            check("primary key", primary_key == ["id", "log_timestamp"], f"({', '.join(primary_key)})")
+
+            cursor.execute("""
+                SELECT pg_get_indexdef(indexrelid) FROM pg_index
+                WHERE indrelid = 'public.attendance_log'::regclass AND NOT indisprimary
+                """)
+            indexes = [definition for (definition,) in cursor.fetchall()]
+            check("indexes", any("(matric_no)" in definition for definition in indexes)
+                  and any("(class_id)" in definition for definition in indexes),
+                  f"{len(indexes)} besides the primary key")
+
+            cursor.execute("SELECT COUNT(*) FROM public.attendance_log_default")
+            check("default partition", cursor.fetchone()[0] == 0, "no rows outside the monthly partitions")
+
+            # The middle of last month, well inside one partition.
+            day = (datetime.date.today().replace(day=1) - datetime.timedelta(days=1)).replace(day=15)
+            report = {"day_start": day, "day_end": day + datetime.timedelta(days=1), "course_code": "CSC1"}
+            expected = {f"attendance_log_p{day:%Y%m}"}
+            for name, sql in (("report", statements.ATTENDANCE_REPORT_SQL),
+                              ("report by course", statements.ATTENDANCE_REPORT_BY_COURSE_SQL)):
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, report)
+                plan = cursor.fetchone()[0][0]["Plan"]
+                partitions = {relation for relation in scanned_relations(plan)
+                              if relation.startswith("attendance_log")}
+                check(f"{name} pruning", partitions == expected,
+                      f"scans {', '.join(sorted(partitions)) or 'nothing'} for {day}")
+        conn.close()
+    finally:
+        if not args.keep:
+            with admin.cursor() as cursor:
+                cursor.execute(f'DROP DATABASE IF EXISTS "{args.database}"')
+        admin.close()
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+loadtest.py
+
+Load test of the `/command` WebSocket endpoint with a simulated fleet of ESP32
+scanners. Each simulated device opens its own connection and replays what a
+scanner does during a lecture: one device starts the class, every device
+enrolls its student, then every device keeps sending verification scans at its
+share of the target rate until the test ends.
+
+At the end the script prints per-command p50/p95/p99 latency of the OK replies,
+the count of each response status (OK, ERR, BUSY, RETAKE, ...) and the overall
+throughput, so capacity and the admission-control limits can be checked before
+deployment. A run in which no verification returned OK is reported as failed
+and exits non-zero.
+
+Devices resend the same capture for the same student, which the server's
+repeat-scan caches (duplicate frames, students already verified) answer without
+encoding. The share of verifications answered from cache, read from the
+server's `/stats`, is printed with the latencies. To measure encode/match
+capacity, run the server with `REPEAT_SCAN_CACHE=False`; `--local` does so
+unless `--caches` is given.
+
+Usage:
+    # Against a running server:
+    python benchmarks/loadtest.py --url ws://localhost:5000/command \\
+        --samples ./samples --devices 50 --rate 20 --duration 60
+
+    # Everything on one machine, no database or network needed:
+    python benchmarks/loadtest.py --local --samples ./samples --devices 50
+
+`--samples` is a directory of JPEG face captures; devices pick them round-robin.
+`--local` starts `server.app` in-process on a free port with the in-memory
+database stand-in from `local_db.py`. Pass `--framed` to use the framed binary
+protocol (see `protocol.py`) and `--pipeline N` to keep N frames in flight per
+device.
+"""
+
+import argparse
+import collections
+import glob
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_websocket  # noqa: E402
+
+import protocol  # noqa: E402
+
+CLASS_DETAILS = {
+    "code": "LDT101",
+    "venue": "Load Test Hall",
+    "start_time": "09:00 AM",
+    "dept": "LDT",
+    "level": 100,
+    "auth_mode": "face",
+    "duration": 2,
+}
+
+
+class Results:
+    """
+    Latencies and response statuses collected from every device thread.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = collections.defaultdict(list)
+        self.statuses: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+
+    def record(self, cmd: str, latency_ms: float, status: str) -> None:
+        with self.lock:
+            # Error replies return long before a capture is recognized, so only
+            # OK replies count towards the latencies.
+            if status == "OK":
+                self.latencies[cmd].append(latency_ms)
+            self.statuses[cmd][status] += 1
+
+    def report(self, elapsed: float, cache_hits: int | None = None) -> bool:
+        """
+        Print the latencies, statuses, cache hits and throughput.
+
+        Returns:
+            bool: False if no verification succeeded, so the latencies measure nothing.
+        """
+        total = 0
+        for cmd in sorted(self.statuses):
+            timings = sorted(self.latencies[cmd])
+            total += sum(self.statuses[cmd].values())
+            if timings:
+                print(f"{cmd:<14} n={len(timings):<6} "
+                      f"p50={percentile(timings, 50):8.1f}ms "
+                      f"p95={percentile(timings, 95):8.1f}ms "
+                      f"p99={percentile(timings, 99):8.1f}ms "
+                      f"mean={statistics.mean(timings):8.1f}ms")
+            else:
+                print(f"{cmd:<14} no OK replies")
+            print(f"{'':<14} " + " ".join(f"{status}={count}"
+                                          for status, count in self.statuses[cmd].most_common()))
+        verifications = len(self.latencies.get("verify_face", ()))
+        if cache_hits is None:
+            print("cache hits: unknown (server /stats not reachable)")
+        elif verifications:
+            print(f"cache hits: {cache_hits} of {verifications} verifications "
+                  f"({cache_hits / verifications:.1%}); the rest were encoded and matched")
+        print(f"{total} responses in {elapsed:.1f}s, {total / elapsed:.1f} req/s")
+        if not verifications:
+            print("FAILED: no verify_face returned OK; check the statuses above and the server log")
+            return False
+        return True
+
+
+def percentile(timings: list[float], pct: float) -> float:
+    if not timings:
+        return 0.0
+    return timings[min(len(timings) - 1, int(len(timings) * pct / 100))]
+
+
+def fetch_cache_hits(url: str) -> int | None:
+    """
+    Read the repeat-scan cache hits from the server's `/stats`.
+
+    Args:
+        url (str): The WebSocket URL of the `/command` endpoint.
+
+    Returns:
+        int | None: Duplicate frame plus already-verified hits, or None if unavailable.
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme = "https" if parts.scheme == "wss" else "http"
+    try:
+        with urllib.request.urlopen(f"{scheme}://{parts.netloc}/stats", timeout=5) as response:
+            stats = json.load(response)
+        return stats["frame_cache"]["hits"] + stats.get("verified", {}).get("hits", 0)
+    except Exception:
+        return None
+
+
+def load_samples(directory: str) -> list[bytes]:
+    paths = sorted(glob.glob(os.path.join(directory, "*.jp*g")))
+    if not paths:
+        raise SystemExit(f"No JPEG samples found in {directory}")
+    samples = []
+    for path in paths:
+        with open(path, "rb") as f:
+            samples.append(f.read())
+    return samples
+
+
+class Device:
+    """
+    One simulated scanner with its own WebSocket connection.
+
+    Args:
+        index (int): Device number, used for its device_id and matric number.
+        args (argparse.Namespace): The command-line options.
+        samples (list[bytes]): JPEG captures to send.
+        results (Results): Where latencies are recorded.
+    """
+
+    def __init__(self, index: int, args: argparse.Namespace, samples: list[bytes], results: Results) -> None:
+        self.args = args
+        self.results = results
+        self.image = samples[index % len(samples)]
+        self.biodata = {
+            "device_id": f"loadtest-{index:04d}",
+            "matric_no": f"LT{index:06d}",
+            "level": CLASS_DETAILS["level"],
+            "dept": CLASS_DETAILS["dept"],
+        }
+        self.rids = itertools.count()
+        self.ws = None
+
+    def request(self, cmd: str, data: dict, image: bytes | None = None) -> dict:
+        started = time.perf_counter()
+        self.ws.send(json.dumps({"cmd": cmd, **data}))
+        if image is not None:
+            self.ws.send(image)
+        response = json.loads(self.ws.receive(timeout=self.args.timeout) or "null") or {"status": "TIMEOUT"}
+        self.results.record(cmd, (time.perf_counter() - started) * 1000, response.get("status", "?"))
+        return response
+
+    def request_frames(self, cmd: str, count: int) -> None:
+        sent = {}
+        for _ in range(count):
+            rid = next(self.rids)
+            sent[rid] = time.perf_counter()
+            self.ws.send(protocol.encode_frame({"cmd": cmd, "rid": rid, **self.biodata}, self.image))
+        while sent:
+            message = self.ws.receive(timeout=self.args.timeout)
+            if message is None:
+                for _ in sent:
+                    self.results.record(cmd, self.args.timeout * 1000, "TIMEOUT")
+                return
+            response = json.loads(message)
+            started = sent.pop(response.get("rid"), None)
+            if started is not None:
+                self.results.record(cmd, (time.perf_counter() - started) * 1000,
+                                    response.get("status", "?"))
+
+    def run(self, start_class: bool, enrolled: threading.Barrier, stop_at: float) -> None:
+        try:
+            self.ws = simple_websocket.Client.connect(self.args.url)
+        except Exception as e:
+            self.results.record("connect", 0.0, type(e).__name__)
+            enrolled.abort()
+            return
+        try:
+            if start_class:
+                self.request("start_class", dict(CLASS_DETAILS))
+            if self.args.framed:
+                self.request_frames("enroll_face", 1)
+            else:
+                self.request("enroll_face", self.biodata, self.image)
+            enrolled.wait()
+
+            # Each device sends its share of the fleet-wide rate, with jitter so
+            # the devices do not fire in lockstep.
+            interval = self.args.devices / self.args.rate
+            time.sleep(random.uniform(0, interval))
+            while time.time() < stop_at:
+                started = time.perf_counter()
+                if self.args.framed:
+                    self.request_frames("verify_face", self.args.pipeline)
+                else:
+                    self.request("verify_face", self.biodata, self.image)
+                time.sleep(max(0.0, interval * self.args.pipeline - (time.perf_counter() - started)))
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:
+            self.results.record("connection", 0.0, type(e).__name__)
+        finally:
+            self.ws.close()
+
+
+def start_local_server(caches: bool) -> str:
+    """
+    Start `server.app` in a background thread with the in-memory database.
+
+    Args:
+        caches (bool): Keep the repeat-scan caches on.
+
+    Returns:
+        str: The WebSocket URL of the `/command` endpoint.
+    """
+    from werkzeug.serving import make_server
+
+    import local_db
+    local_db.install()
+
+    import face_app
+    import server
+
+    face_app.REPEAT_SCAN_CACHE = caches
+    face_app.warmup()
+    # Enrollments save their capture here; a deployment creates it with static/.
+    os.makedirs("./static/enrolled", exist_ok=True)
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, name="loadtest-server", daemon=True).start()
+    return f"ws://127.0.0.1:{httpd.server_port}/command"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--url", default="ws://localhost:5000/command")
+    parser.add_argument("--local", action="store_true",
+                        help="Run the server in-process against the in-memory database.")
+    parser.add_argument("--caches", action="store_true",
+                        help="With --local, keep the repeat-scan caches on.")
+    parser.add_argument("--samples", required=True, help="Directory of JPEG face captures.")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="Target verifications per second across all devices.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of verification traffic.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each response.")
+    parser.add_argument("--framed", action="store_true")
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="Frames in flight per device (with --framed).")
+    args = parser.parse_args()
+    if not args.framed:
+        args.pipeline = 1
+
+    samples = load_samples(args.samples)
+    if args.local:
+        args.url = start_local_server(args.caches)
+
+    results = Results()
+    enrolled = threading.Barrier(args.devices)
+    devices = [Device(i, args, samples, results) for i in range(args.devices)]
+
+    hits_before = fetch_cache_hits(args.url)
+    started = time.time()
+    stop_at = started + args.duration
+    threads = [threading.Thread(target=device.run, args=(i == 0, enrolled, stop_at), daemon=True)
+               for i, device in enumerate(devices)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.time() - started
+    hits_after = fetch_cache_hits(args.url)
+    cache_hits = None if hits_before is None or hits_after is None else hits_after - hits_before
+    if not results.report(elapsed, cache_hits):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+local_db.py
+
+An in-memory stand-in for the PostgreSQL side of `face_app`, for running the
+server and the load test on one machine without a database. `install()` replaces
+the face_app functions that issue SQL with versions backed by Python
+dictionaries; face detection, the quality gate and face encoding are untouched,
+so CPU costs stay realistic.
+
+Not for production use: nothing is persisted and there is no pgvector index,
+matching is a linear scan in NumPy.
+"""
+
+import datetime
+import itertools
+import threading
+
+import numpy as np
+
+import face_app
+
+
+class InMemoryStore:
+    """
+    The tables face_app uses, as dictionaries guarded by one lock.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.students: dict[str, dict] = {}
+        self.classes: dict[int, dict] = {}
+        self.attendance: list[dict] = []
+        self._class_ids = itertools.count(1)
+
+    def get_department_id(self, department: str | None) -> int:
+        return 0 if department is None else abs(hash(department)) % 1000
+
+    def get_college_id(self, college: str | None) -> int:
+        return 0 if college is None else abs(hash(college)) % 1000
+
+    def get_student_id(self, matric_no: str) -> int:
+        with self.lock:
+            return self.students[matric_no]["id"]
+
+    def get_current_class_id(self, course_code: str | None) -> int:
+        if course_code is None:
+            return 0
+        with self.lock:
+            ids = [class_id for class_id, details in self.classes.items()
+                   if details.get("code") == course_code]
+        return max(ids, default=None)
+
+    def log(self, **data) -> None:
+        data["class_id"] = face_app.current_class_id
+        data["log_timestamp"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        data["image_url"] = data.get("image_filename")
+        key = data.get("idempotency_key")
+        with self.lock:
+            if key is not None and any(row.get("idempotency_key") == key for row in self.attendance):
+                return
+            self.attendance.append(data)
+
+    def log_many(self, rows: list[dict]) -> None:
+        for row in rows:
+            self.log(**row)
+
+    def save_face_embedding(self, face_embed, **biodata) -> None:
+        with self.lock:
+            self.students[biodata.get("matric_no")] = {
+                "id": len(self.students) + 1,
+                "matric_no": biodata.get("matric_no"),
+                "level": biodata.get("level"),
+                "dept": biodata.get("dept"),
+                "face_embed": np.asarray(face_embed, dtype=np.float64),
+            }
+
+    def register_new_user(self, register_new_user_saved_capture=None, face_flag: bool = False, **biodata) -> None:
+        if face_flag:
+            self.save_face_embedding(face_app.encode_face(register_new_user_saved_capture), **biodata)
+            return
+        if biodata.get("name") is None:
+            raise face_app.Invalid_Username("Username cannot be empty")
+        with self.lock:
+            student = self.students.setdefault(biodata.get("matric_no"), {"id": len(self.students) + 1})
+            student["name"] = biodata.get("name")
+
+    def match_face(self, login_user_embed, **data) -> tuple[bool, str, float]:
+        with self.lock:
+            student = self.students.get(data.get("matric_no"))
+        if student is None or student.get("face_embed") is None:
+            raise face_app.User_Not_Registered("User not registered")
+        # Same measure as the SQL query: SQRT of the L2 distance.
+        l2_confidence = float(np.sqrt(np.linalg.norm(student["face_embed"] - login_user_embed)))
+        data["verified"] = l2_confidence < face_app.THRESHOLD
+        data["l2_confidence"] = l2_confidence
+        face_app.log(**data)
+        return data["verified"], student["matric_no"], l2_confidence
+
+    def search_faces(self, face_embed, k: int = face_app.IDENTIFY_TOP_K,
+                     ef_search: int | None = None, probes: int | None = None) -> list[dict]:
+        with self.lock:
+            enrolled = [s for s in self.students.values() if s.get("face_embed") is not None]
+        distances = [(float(np.sqrt(np.linalg.norm(s["face_embed"] - face_embed))), s["matric_no"])
+                     for s in enrolled]
+        return [{"matric_no": matric_no, "l2_confidence": l2, "verified": l2 < face_app.THRESHOLD}
+                for l2, matric_no in sorted(distances)[:int(k)]]
+
+    def get_verified_students(self, class_id: int) -> list[tuple[str, float]]:
+        with self.lock:
+            best = {}
+            for row in self.attendance:
+                if row.get("class_id") == class_id and row.get("verified"):
+                    best[row["matric_no"]] = min(best.get(row["matric_no"], row["l2_confidence"]),
+                                                 row["l2_confidence"])
+        return list(best.items())
+
+    def log_class_details(self, class_details: dict) -> int:
+        with self.lock:
+            class_id = next(self._class_ids)
+            self.classes[class_id] = dict(class_details)
+        face_app.current_class_id = class_id
+        return class_id
+
+    def get_class_roster(self, class_id: int) -> tuple[list[dict], np.ndarray]:
+        with self.lock:
+            details = self.classes.get(class_id, {})
+            enrolled = [s for s in self.students.values()
+                        if s.get("face_embed") is not None
+                        and s.get("dept") == details.get("dept") and s.get("level") == details.get("level")]
+        students = [{"matric_no": s["matric_no"], "level": s["level"], "dept": s["dept"]} for s in enrolled]
+        embeds = np.array([s["face_embed"] for s in enrolled]).reshape(len(enrolled), -1)
+        return students, embeds
+
+    def referenced_images(self, paths: list[str]) -> set[str]:
+        with self.lock:
+            stored = {row.get("image_url") for row in self.attendance}
+        return {path for path in paths if path in stored}
+
+    def database_ready(self) -> bool:
+        return True
+
+
+_PATCHED = (
+    "get_department_id", "get_college_id", "get_student_id", "get_current_class_id",
+    "log", "log_many", "save_face_embedding", "register_new_user", "match_face", "search_faces", "get_verified_students",
+    "log_class_details", "get_class_roster", "referenced_images", "database_ready",
+)
+
+
+def install(store: InMemoryStore | None = None) -> InMemoryStore:
+    """
+    Replace the database-backed functions of face_app with an in-memory store.
+
+    Must be called before the server handles any request.
+
+    Args:
+        store (InMemoryStore | None): The store to use. A new one by default.
+
+    Returns:
+        InMemoryStore: The installed store.
+    """
+    store = store or InMemoryStore()
+    for name in _PATCHED:
+        setattr(face_app, name, getattr(store, name))
+    return store
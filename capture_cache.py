@@ -0,0 +1,312 @@
+"""
+capture_cache.py
+
+This module manages the directory of scan captures written by `verify_face`. New
+captures go into one sub-directory per day, and a background pruner keeps the
+whole cache under a byte budget and a retention period.
+
+Pruning works through the captures from least to most recently used until the
+cache is back under budget:
+- Captures no attendance row refers to are deleted.
+- Captures still referenced by `attendance_log.image_url` are downsampled to a
+  thumbnail in place, so their URL keeps working at a fraction of the size.
+- Anything older than the retention period is deleted, referenced or not.
+
+Small previews for the attendance pages are generated on first request and kept
+in a separate directory; they are deleted along with their capture.
+
+Dependencies:
+- PIL (Pillow)
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from PIL import Image
+
+CAPTURE_CACHE_DIR = os.getenv('CAPTURE_CACHE_DIR', './static/cache')
+CAPTURE_CACHE_MAX_BYTES = int(os.getenv('CAPTURE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+CAPTURE_CACHE_RETENTION_DAYS = float(os.getenv('CAPTURE_CACHE_RETENTION_DAYS', 180))
+CAPTURE_CACHE_PRUNE_INTERVAL = float(os.getenv('CAPTURE_CACHE_PRUNE_INTERVAL', 600))
+CAPTURE_THUMBNAIL_SIZE = int(os.getenv('CAPTURE_THUMBNAIL_SIZE', 256))
+CAPTURE_PREVIEW_DIR = os.getenv('CAPTURE_PREVIEW_DIR', './static/previews')
+CAPTURE_PREVIEW_SIZE = int(os.getenv('CAPTURE_PREVIEW_SIZE', 128))
+
+# Captures this recent are never pruned: their attendance row may not have
+# been written yet.
+_GRACE_PERIOD = 3600
+
+
+def _save_thumbnail(image: Image.Image, size: int, path: str) -> None:
+    image.thumbnail((size, size))
+    tmp_path = f"{path}.tmp"
+    image.convert("RGB").save(tmp_path, format="JPEG", quality=75)
+    os.replace(tmp_path, path)
+
+
+def downsample(path: str, size: int = CAPTURE_THUMBNAIL_SIZE) -> bool:
+    """
+    Replace an image with a thumbnail of itself, keeping its path.
+
+    Args:
+        path (str): The image file.
+        size (int): Maximum width and height of the thumbnail.
+
+    Returns:
+        bool: False if the image was already no larger than the thumbnail size.
+    """
+    with Image.open(path) as image:
+        if max(image.size) <= size:
+            return False
+        _save_thumbnail(image, size, path)
+    return True
+
+
+class CaptureCache:
+    """
+    A size- and age-bounded, per-day sharded directory of captures.
+
+    Args:
+        root (str): The cache directory.
+        max_bytes (int): Size the pruner brings the cache back under.
+        retention_days (float): Age after which captures are always deleted.
+        prune_interval (float): Seconds between background prune passes.
+        thumbnail_size (int): Size referenced captures are downsampled to.
+        is_referenced (callable | None): Given a list of capture paths, returns the
+            set of those still referenced by attendance rows. Without it, every
+            capture is treated as referenced and only downsampled.
+        preview_root (str): Directory of the small previews shown on attendance pages.
+        preview_size (int): Size of the previews.
+    """
+
+    def __init__(self, root: str = CAPTURE_CACHE_DIR,
+                 max_bytes: int = CAPTURE_CACHE_MAX_BYTES,
+                 retention_days: float = CAPTURE_CACHE_RETENTION_DAYS,
+                 prune_interval: float = CAPTURE_CACHE_PRUNE_INTERVAL,
+                 thumbnail_size: int = CAPTURE_THUMBNAIL_SIZE,
+                 is_referenced=None,
+                 preview_root: str = CAPTURE_PREVIEW_DIR,
+                 preview_size: int = CAPTURE_PREVIEW_SIZE) -> None:
+        self.root = root.rstrip("/")
+        self.preview_root = preview_root.rstrip("/")
+        self.preview_size = preview_size
+        self.max_bytes = max_bytes
+        self.retention = retention_days * 86400
+        self.prune_interval = prune_interval
+        self.thumbnail_size = thumbnail_size
+        self.is_referenced = is_referenced
+
+        self._lock = threading.Lock()
+        self._pruner: threading.Thread | None = None
+        self._size = 0
+        self._files = 0
+        self._deleted = 0
+        self._downsampled = 0
+        self._expired = 0
+        self._bytes_freed = 0
+        self._last_prune: float | None = None
+
+    def path_for(self, name: str, when: datetime | None = None) -> str:
+        """
+        Get the path for a new capture, in the shard of its day.
+
+        Also starts the background pruner on first use.
+
+        Args:
+            name (str): The file name prefix, e.g. the matric number.
+            when (datetime | None): The capture time. Defaults to now.
+
+        Returns:
+            str: The path to save the capture to.
+        """
+        when = when or datetime.now()
+        shard = os.path.join(self.root, when.strftime('%Y%m%d'))
+        os.makedirs(shard, exist_ok=True)
+        self.start_pruner()
+        return f"{shard}/{name}_{when.strftime('%Y%m%d_%H%M%S')}.jpg"
+
+    def touch(self, path: str) -> None:
+        """
+        Mark a capture as recently used.
+
+        Args:
+            path (str): The capture path.
+        """
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def resolve(self, relative_path: str) -> str | None:
+        """
+        Map a path relative to the cache directory to a capture file.
+
+        Args:
+            relative_path (str): E.g. "20250101/190401001_20250101_093000.jpg".
+
+        Returns:
+            str | None: The capture path, or None if it is outside the cache or missing.
+        """
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, relative_path))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def relative_path(self, image_url: str) -> str:
+        """
+        Get the path of a stored `image_url` relative to the cache directory.
+
+        Args:
+            image_url (str): The path as stored in `attendance_log.image_url`.
+
+        Returns:
+            str: The relative path.
+        """
+        return os.path.relpath(os.path.realpath(image_url), os.path.realpath(self.root))
+
+    def preview_path(self, path: str) -> str:
+        return os.path.join(self.preview_root,
+                            os.path.relpath(os.path.realpath(path), os.path.realpath(self.root)))
+
+    def preview_for(self, path: str) -> str:
+        """
+        Get the preview of a capture, generating it on first request.
+
+        Args:
+            path (str): The capture path.
+
+        Returns:
+            str: The preview path.
+        """
+        preview = self.preview_path(path)
+        if not os.path.exists(preview):
+            os.makedirs(os.path.dirname(preview), exist_ok=True)
+            with Image.open(path) as image:
+                _save_thumbnail(image, self.preview_size, preview)
+        return preview
+
+    def _remove_preview(self, path: str) -> None:
+        try:
+            os.remove(self.preview_path(path))
+        except OSError:
+            pass
+
+    def _scan(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.lower().endswith((".jpg", ".jpeg", ".png")):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def _remove_empty_shards(self) -> None:
+        # Today's shard may have just been created for a capture being saved.
+        today = datetime.now().strftime('%Y%m%d')
+        for root in (self.root, self.preview_root):
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if entry.is_dir() and entry.name != today and not os.listdir(entry.path):
+                    os.rmdir(entry.path)
+
+    def prune(self) -> dict:
+        """
+        Run one prune pass.
+
+        Returns:
+            dict: The cache statistics after the pass.
+        """
+        if not os.path.isdir(self.root):
+            return self.stats()
+
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        expire_before = time.time() - self.retention
+        grace_after = time.time() - _GRACE_PERIOD
+        paths = [path for _, _, path in entries]
+        referenced = set(self.is_referenced(paths)) if self.is_referenced else set(paths)
+
+        deleted = downsampled = expired = freed = 0
+        for last_used, size, path in entries:
+            if last_used > grace_after or (total <= self.max_bytes and last_used >= expire_before):
+                break
+            try:
+                if last_used < expire_before or path not in referenced:
+                    os.remove(path)
+                    self._remove_preview(path)
+                    expired += last_used < expire_before
+                    deleted += 1
+                    saved = size
+                elif downsample(path, self.thumbnail_size):
+                    downsampled += 1
+                    saved = size - os.path.getsize(path)
+                else:
+                    continue
+            except OSError as e:
+                logging.warning(f"Could not prune capture {path}: {e}")
+                continue
+            total -= saved
+            freed += saved
+
+        self._remove_empty_shards()
+        with self._lock:
+            self._size = total
+            self._files = len(entries) - deleted
+            self._deleted += deleted
+            self._downsampled += downsampled
+            self._expired += expired
+            self._bytes_freed += freed
+            self._last_prune = time.time()
+        if deleted or downsampled:
+            logging.info(f"Capture cache pruned: {deleted} deleted, {downsampled} downsampled, "
+                         f"{freed} bytes freed")
+        return self.stats()
+
+    def _prune_forever(self) -> None:
+        while True:
+            try:
+                self.prune()
+            except Exception as e:
+                logging.error(f"Capture cache prune failed: {e}")
+            time.sleep(self.prune_interval)
+
+    def start_pruner(self) -> None:
+        """
+        Start the background pruner, unless it is already running.
+        """
+        with self._lock:
+            if self._pruner is None:
+                self._pruner = threading.Thread(target=self._prune_forever,
+                                                name="capture-pruner", daemon=True)
+                self._pruner.start()
+
+    def stats(self) -> dict:
+        """
+        Report cache size and eviction counters as of the last prune pass.
+
+        Returns:
+            dict: Size, limits and counters.
+        """
+        with self._lock:
+            return {
+                "bytes": self._size,
+                "files": self._files,
+                "max_bytes": self.max_bytes,
+                "retention_days": self.retention / 86400,
+                "deleted": self._deleted,
+                "downsampled": self._downsampled,
+                "expired": self._expired,
+                "bytes_freed": self._bytes_freed,
+                "last_prune": self._last_prune,
+            }
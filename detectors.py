@@ -0,0 +1,228 @@
+"""
+detectors.py
+
+This module implements the face detectors that locate faces before they are
+encoded. The dlib HOG detector used by face_recognition is accurate but slow on
+high-resolution frames; the OpenCV detectors are several times faster on CPU.
+Frames are BGR, as OpenCV captures them and as `face_app` passes them. Every
+backend returns boxes as (top, right, bottom, left), the `known_face_locations`
+format of `face_recognition.face_encodings`.
+
+Backends (`FACE_DETECTOR`):
+- `hog`: dlib HOG through face_recognition (the default).
+- `cnn`: dlib CNN through face_recognition. Most accurate, only practical on a GPU.
+- `haar`: OpenCV Haar cascade, shipped with opencv-python.
+- `dnn`: OpenCV DNN (ResNet-10 SSD). The model is not shipped with opencv-python;
+  set `FACE_DNN_MODEL` and `FACE_DNN_CONFIG` to the Caffe model and prototxt.
+
+Frames wider than `FACE_DETECTOR_MAX_WIDTH` (0 disables) are scaled down before
+detection and the boxes scaled back up. Models are loaded on first use.
+
+Dependencies:
+- face_recognition (hog, cnn)
+- OpenCV (cv2)
+- NumPy
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+FACE_DETECTOR = os.getenv('FACE_DETECTOR', 'hog')
+FACE_DETECTOR_MAX_WIDTH = int(os.getenv('FACE_DETECTOR_MAX_WIDTH', 0))
+FACE_DETECTOR_UPSAMPLE = int(os.getenv('FACE_DETECTOR_UPSAMPLE', 1))
+FACE_HAAR_CASCADE = os.getenv(
+    'FACE_HAAR_CASCADE', os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+FACE_DNN_MODEL = os.getenv('FACE_DNN_MODEL', 'models/res10_300x300_ssd_iter_140000.caffemodel')
+FACE_DNN_CONFIG = os.getenv('FACE_DNN_CONFIG', 'models/deploy.prototxt')
+FACE_DNN_CONFIDENCE = float(os.getenv('FACE_DNN_CONFIDENCE', 0.5))
+
+Box = tuple[int, int, int, int]
+
+
+class Detector:
+    """
+    Base class of the face detectors.
+
+    Subclasses implement `_detect` on the (possibly scaled down) frame; scaling
+    the boxes back and clipping them to the frame is done here.
+
+    Args:
+        max_width (int): Frames wider than this are scaled down before detection; 0 disables.
+        upsample (int): Default number of times to upsample the frame when looking for
+            small faces. Backends without upsampling use it to lower the minimum face size.
+    """
+
+    name = ""
+
+    def __init__(self, max_width: int = FACE_DETECTOR_MAX_WIDTH,
+                 upsample: int = FACE_DETECTOR_UPSAMPLE) -> None:
+        self.max_width = max_width
+        self.upsample = upsample
+
+    def _detect(self, image: np.ndarray, upsample: int) -> list[Box]:
+        raise NotImplementedError
+
+    def warmup(self) -> None:
+        """
+        Load the model and run it once on a blank frame.
+        """
+        self.detect(np.zeros((160, 160, 3), dtype=np.uint8))
+
+    def detect(self, capture: np.ndarray, upsample: int | None = None) -> list[Box]:
+        """
+        Find the faces in a BGR capture.
+
+        Args:
+            capture (np.ndarray): The capture.
+            upsample (int | None): Overrides the detector's `upsample`.
+
+        Returns:
+            list[Box]: One (top, right, bottom, left) box per face, in capture coordinates.
+        """
+        upsample = self.upsample if upsample is None else upsample
+        height, width = capture.shape[:2]
+        scale = 1.0
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / width
+            capture = cv2.resize(capture, (self.max_width, round(height * scale)),
+                                 interpolation=cv2.INTER_AREA)
+
+        boxes = []
+        for top, right, bottom, left in self._detect(capture, upsample):
+            boxes.append((max(0, round(top / scale)), min(width, round(right / scale)),
+                          min(height, round(bottom / scale)), max(0, round(left / scale))))
+        return [box for box in boxes if box[2] > box[0] and box[1] > box[3]]
+
+
+class DlibDetector(Detector):
+    """
+    dlib's HOG or CNN detector, through face_recognition.
+    """
+
+    def __init__(self, model: str = "hog", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.model = model
+        self.name = model
+
+    def _detect(self, image: np.ndarray, upsample: int) -> list[Box]:
+        # Imported here so that the dlib models are only loaded when used.
+        import face_recognition
+        return face_recognition.face_locations(
+            image, number_of_times_to_upsample=upsample, model=self.model)
+
+
+class HaarDetector(Detector):
+    """
+    OpenCV's Haar cascade frontal face detector.
+
+    Args:
+        cascade (str): Path of the cascade XML file.
+        min_size (int): Smallest face side in pixels at upsample 0; each upsample halves it.
+    """
+
+    name = "haar"
+
+    def __init__(self, cascade: str = FACE_HAAR_CASCADE, min_size: int = 80, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.cascade = cascade
+        self.min_size = min_size
+        # Classifiers are not safe to share between threads.
+        self._local = threading.local()
+
+    def _classifier(self) -> cv2.CascadeClassifier:
+        classifier = getattr(self._local, "classifier", None)
+        if classifier is None:
+            classifier = cv2.CascadeClassifier(self.cascade)
+            if classifier.empty():
+                raise FileNotFoundError(f"Haar cascade not found: {self.cascade}")
+            self._local.classifier = classifier
+        return classifier
+
+    def _detect(self, image: np.ndarray, upsample: int) -> list[Box]:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        min_size = max(20, self.min_size >> max(upsample, 0))
+        faces = self._classifier().detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
+
+
+class DnnDetector(Detector):
+    """
+    OpenCV's DNN face detector (ResNet-10 SSD, Caffe). Runs at a fixed input
+    size, so `upsample` is ignored.
+
+    Args:
+        model (str): Path of the Caffe model.
+        config (str): Path of the prototxt.
+        confidence (float): Minimum detection confidence.
+    """
+
+    name = "dnn"
+
+    def __init__(self, model: str = FACE_DNN_MODEL, config: str = FACE_DNN_CONFIG,
+                 confidence: float = FACE_DNN_CONFIDENCE, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.model = model
+        self.config = config
+        self.confidence = confidence
+        # A network is not safe to run from several threads at once.
+        self._local = threading.local()
+
+    def _net(self):
+        net = getattr(self._local, "net", None)
+        if net is None:
+            for path in (self.model, self.config):
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"DNN face detector file not found: {path}")
+            net = cv2.dnn.readNetFromCaffe(self.config, self.model)
+            self._local.net = net
+        return net
+
+    def _detect(self, image: np.ndarray, upsample: int) -> list[Box]:
+        height, width = image.shape[:2]
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        # The model was trained on BGR images with these channel means, so the
+        # frame is used as is.
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300),
+                                     (104.0, 177.0, 123.0), swapRB=False)
+        net = self._net()
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+
+        boxes = []
+        for detection in detections[detections[:, 2] >= self.confidence]:
+            left, top, right, bottom = detection[3:7] * (width, height, width, height)
+            boxes.append((int(top), int(right), int(bottom), int(left)))
+        return boxes
+
+
+DETECTORS = {
+    "hog": lambda **kwargs: DlibDetector("hog", **kwargs),
+    "cnn": lambda **kwargs: DlibDetector("cnn", **kwargs),
+    "haar": HaarDetector,
+    "dnn": DnnDetector,
+}
+
+
+def get_detector(name: str | None = None, **kwargs) -> Detector:
+    """
+    Create a face detector.
+
+    Args:
+        name (str | None): One of `DETECTORS`. Defaults to `FACE_DETECTOR`.
+        kwargs (dict): Options of the detector class (e.g. `max_width`).
+
+    Returns:
+        Detector: The detector. Its model is loaded on first use.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    name = name or FACE_DETECTOR
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector {name!r}; choose from {', '.join(DETECTORS)}")
+    return DETECTORS[name](**kwargs)
@@ -7,9 +7,14 @@ and uses the `face_recognition` library for face encoding and matching.
 
 Features:
 - Database integration for storing user and attendance data.
+- A thread-safe connection pool shared by every caller.
 - Face recognition using the `face_recognition` library.
+- Pluggable face detectors (see `detectors.py`).
+- Live attendance events for open attendance pages (see `live.py`).
 - Custom exceptions for specific error cases.
 - Utility functions for retrieving IDs from the database.
+- Lazy initialisation: the database is connected and the models are loaded on
+  first use or by an explicit `warmup`, never at import time.
 
 Dependencies:
 - face_recognition
@@ -18,12 +23,26 @@ Dependencies:
 - NumPy
 """
 
+import logging
 import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from dotenv import load_dotenv
-import face_recognition
 import datetime
+import json
 from cv2 import Mat
 import psycopg2
+import psycopg2.pool
+import psycopg2.extras
+import numpy as np
+import detectors
+import frame_cache
+import live
+import quality
+import statements
+from quality import Poor_Capture_Quality
 
 # Load environment variables from .env file
 load_dotenv()
@@ -34,16 +53,99 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = os.getenv('DB_PORT', '5432')
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
+# Connection pool shared by every thread that talks to the database.
+# It is created on first use, so importing this module never connects and
+# worker processes which only encode faces never open a connection.
+_pg_pool: psycopg2.pool.ThreadedConnectionPool | None = None
+_pg_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises as soon as it is exhausted; callers queue
+# here for a free connection instead, up to DB_POOL_TIMEOUT seconds.
+_pg_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+def get_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    """
+    Get the shared database connection pool, creating it if necessary.
+
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool: The connection pool.
+    """
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                _pg_pool = psycopg2.pool.ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    connect_timeout=DB_CONNECT_TIMEOUT,
+                    connection_factory=statements.PreparingConnection
+                )
+    return _pg_pool
+
+
+def connect():
+    """
+    Open a dedicated database connection outside the pool, e.g. to LISTEN on.
 
-# Update database connection
-pg_db = psycopg2.connect(
-    dbname=os.getenv("DB_NAME"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT")
-)
-pg_cursor = pg_db.cursor()
+    Returns:
+        psycopg2.extensions.connection: The connection.
+    """
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+    )
+
+
+@contextmanager
+def db_cursor():
+    """
+    Borrow a pooled connection and yield a cursor on it.
+
+    The transaction is committed when the block exits normally and rolled
+    back if it raises. Broken connections are discarded instead of being
+    returned to the pool. When every connection is in use, waits up to
+    `DB_POOL_TIMEOUT` seconds for one to be returned.
+
+    Yields:
+        psycopg2.extensions.cursor: A cursor on the borrowed connection.
+
+    Raises:
+        psycopg2.pool.PoolError: If no connection became free in time.
+    """
+    pool = get_pool()
+    if not _pg_pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError(
+            f"No database connection free after {DB_POOL_TIMEOUT:g}s")
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _pg_pool_slots.release()
+        raise
+    try:
+        with conn.cursor() as cursor:
+            yield cursor
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+        _pg_pool_slots.release()
 
 
 class No_Face_Detected(Exception):
@@ -63,14 +165,122 @@ class Invalid_Username(Exception):
 
 
 DB_DIR = "./db"
-if not os.path.exists(DB_DIR):
-    os.mkdir(DB_DIR)
 
 THRESHOLD = 0.65
 
+# Group captures are wide shots with small faces: upsample more when
+# detecting, and encode every face once instead of with jitter.
+GROUP_UPSAMPLE = int(os.getenv('GROUP_UPSAMPLE', 2))
+GROUP_NUM_JITTERS = int(os.getenv('GROUP_NUM_JITTERS', 1))
+
+# 1:N identification returns this many candidates by default. The search
+# breadth of the vector index can be overridden per request; unset, the
+# server's hnsw.ef_search / ivfflat.probes settings apply.
+IDENTIFY_TOP_K = int(os.getenv('IDENTIFY_TOP_K', 5))
+
 
 current_class_id: int = 0
 
+# Recent verdicts, so a device resending the same capture is not encoded
+# and logged twice.
+result_cache = frame_cache.FrameCache()
+
+# Rejects captures that are not worth encoding.
+quality_gate = quality.QualityGate()
+
+# Locates faces before encoding; the backend is chosen with FACE_DETECTOR.
+face_detector = detectors.get_detector()
+
+# Pushes committed attendance rows to the live attendance pages.
+attendance_feed = live.AttendanceFeed()
+
+# Course code of each class seen, for the live attendance events.
+_course_codes: dict[int, str | None] = {}
+
+# Students already verified in each recent class, with their verdict, so repeat
+# scans ("did it work?") are answered without encoding or logging again. Seeded
+# from attendance_log when a class starts or is first seen after a restart.
+VERIFIED_CLASSES = int(os.getenv('VERIFIED_CLASSES', 64))
+_verified: OrderedDict[int, dict[str, tuple[bool, str, float]]] = OrderedDict()
+_verified_lock = threading.Lock()
+_verified_hits = 0
+
+# With REPEAT_SCAN_CACHE=False every scan is encoded and matched, e.g. to
+# measure recognition capacity with a load test that replays the same captures.
+REPEAT_SCAN_CACHE = os.getenv('REPEAT_SCAN_CACHE', 'True') == 'True'
+
+
+# face_recognition loads its dlib models when it is imported, which takes
+# long enough to matter for cold starts, so it is imported on first use.
+_face_recognition = None
+_models_lock = threading.Lock()
+_models_warm = threading.Event()
+_warmup_thread: threading.Thread | None = None
+
+
+def load_models():
+    """
+    Import face_recognition (loading the dlib models) if it has not been imported yet.
+
+    Returns:
+        module: The face_recognition module.
+    """
+    global _face_recognition
+    if _face_recognition is None:
+        with _models_lock:
+            if _face_recognition is None:
+                import face_recognition
+                _face_recognition = face_recognition
+    return _face_recognition
+
+
+def warmup() -> None:
+    """
+    Load the models and run them once on a blank frame, so that the first
+    real scan does not pay for initialisation.
+    """
+    face_recognition = load_models()
+    blank = np.zeros((160, 160, 3), dtype=np.uint8)
+    face_detector.warmup()
+    face_recognition.face_encodings(blank, known_face_locations=[(20, 140, 140, 20)])
+    _models_warm.set()
+
+
+def start_warmup() -> None:
+    """
+    Start `warmup` in a background thread, unless it has already been started.
+    """
+    global _warmup_thread
+    with _models_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warmup, name="face_app-warmup", daemon=True)
+            _warmup_thread.start()
+
+
+def models_ready() -> bool:
+    """
+    Check whether the models have been loaded and warmed up.
+
+    Returns:
+        bool: True once `warmup` has completed.
+    """
+    return _models_warm.is_set()
+
+
+def database_ready() -> bool:
+    """
+    Check whether the database is reachable.
+
+    Returns:
+        bool: True if a pooled connection can run a query.
+    """
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except psycopg2.Error:
+        return False
+
 
 def get_department_id(department: str | None) -> int:
     """
@@ -84,9 +294,10 @@ def get_department_id(department: str | None) -> int:
     """
     if department is None:
         return 0
-    pg_cursor.execute(
-        "SELECT id FROM departments WHERE code = %s", (department,))
-    return pg_cursor.fetchall()[0][0]
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM departments WHERE code = %s", (department,))
+        return cursor.fetchall()[0][0]
 
 
 def get_college_id(college: str | None) -> int:
@@ -101,8 +312,9 @@ def get_college_id(college: str | None) -> int:
     """
     if college is None:
         return 0
-    pg_cursor.execute("SELECT id FROM colleges WHERE name = %s", (college,))
-    return pg_cursor.fetchall()[0][0]
+    with db_cursor() as cursor:
+        cursor.execute("SELECT id FROM colleges WHERE name = %s", (college,))
+        return cursor.fetchall()[0][0]
 
 
 def get_student_id(matric_no: str) -> int:
@@ -115,35 +327,80 @@ def get_student_id(matric_no: str) -> int:
     Returns:
         int: The student ID.
     """
-    pg_cursor.execute(
-        "SELECT id FROM students_biodata WHERE matric_no = %s", (matric_no,)
-    )
-    return pg_cursor.fetchall()[0][0]
+    with db_cursor() as cursor:
+        statements.GET_STUDENT_ID.execute(cursor, (matric_no,))
+        return cursor.fetchall()[0][0]
 
 
 def get_location_id(location: str) -> int:
-    pg_cursor.execute(
-        "SELECT id FROM locations WHERE name = %s", (location,))
-    return pg_cursor.fetchall()[0][0]
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM locations WHERE name = %s", (location,))
+        return cursor.fetchall()[0][0]
 
 
 def get_course_id(course: str) -> int:
-    pg_cursor.execute(
-        "SELECT id FROM courses WHERE course_code = %s", (course,))
-    return pg_cursor.fetchall()[0][0]
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM courses WHERE course_code = %s", (course,))
+        return cursor.fetchall()[0][0]
+
+
+def get_course_code(class_id: int | None) -> str | None:
+    """
+    Get the course code of a class, remembering it for later calls.
+
+    Args:
+        class_id (int | None): The class ID.
+
+    Returns:
+        str | None: The course code, or None if there is no such class.
+    """
+    if not class_id:
+        return None
+    if class_id not in _course_codes:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT course_code FROM classes WHERE id = %s", (class_id,))
+            row = cursor.fetchone()
+        _course_codes[class_id] = row[0] if row else None
+    return _course_codes[class_id]
+
+
+def attendance_event(row: dict, logged_at: datetime.datetime) -> dict:
+    """
+    Describe a logged attendance row for the live attendance pages.
+
+    Args:
+        row (dict): Attendance data, with the same keys as `log`.
+        logged_at (datetime.datetime): The row's log_timestamp.
+
+    Returns:
+        dict: The event, with the columns shown on the attendance page.
+    """
+    class_id = row.get("class_id", current_class_id)
+    return {"matric_no": row.get("matric_no"),
+            "dept": row.get("dept"),
+            "level": row.get("level"),
+            "verified": bool(row.get("verified", False)),
+            "image_url": row.get("image_filename"),
+            "class_id": class_id,
+            "course_code": get_course_code(class_id),
+            "date": logged_at.strftime("%Y-%m-%d"),
+            "time": logged_at.strftime("%I:%M:%S %p")}
 
 
 def get_current_class_id(course_code: str | None) -> int:
     if course_code is None:
         return 0
-    pg_cursor.execute(
-        "SELECT MAX(id) FROM classes WHERE course_code = %s", (course_code,))
-    return pg_cursor.fetchall()[0][0]
+    with db_cursor() as cursor:
+        statements.GET_CURRENT_CLASS_ID.execute(cursor, (course_code,))
+        return cursor.fetchall()[0][0]
 
 
 def log(**data) -> None:
     """
-    Log attendance data to the database.
+    Log attendance data to the database and send it to the live attendance
+    pages once committed.
 
     Args:
         data (dict): Attendance data to log.
@@ -153,122 +410,603 @@ def log(**data) -> None:
     """
     global current_class_id
     data["class_id"] = current_class_id
-    data["log_timestamp"] = datetime.datetime.now().strftime(
-        "%Y-%m-%d %H:%M:%S.%f")
+    logged_at = datetime.datetime.now()
+    data["log_timestamp"] = logged_at.strftime("%Y-%m-%d %H:%M:%S.%f")
     data["image_url"] = data.get("image_filename")
     data["verified"] = data.get("verified", False)
     data["scan_timestamp"] = data.get(
         "scan_timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
     data["l2_confidence"] = data.get("l2_confidence")
+    data["idempotency_key"] = data.get("idempotency_key")
     print(data)
     try:
-        pg_cursor.execute(
+        event = attendance_event(data, logged_at)
+        with db_cursor() as cursor:
+            if data["idempotency_key"] is not None:
+                statements.CLAIM_IDEMPOTENCY_KEY.execute(cursor, data)
+                if cursor.fetchone() is None:
+                    return  # A retry of a request that was already logged.
+            statements.LOG_ATTENDANCE.execute(cursor, data)
+            if live.LIVE_FEED_NOTIFY:
+                live.notify(cursor, [event])
+    except psycopg2.Error as e:
+        raise Exception(f"Database error: {e}")
+    if not live.LIVE_FEED_NOTIFY:
+        attendance_feed.publish(event)
+
+
+def log_many(rows: list[dict]) -> None:
+    """
+    Log several attendance rows in one statement and send them to the live
+    attendance pages once committed.
+
+    Args:
+        rows (list[dict]): Attendance data, one dict per row, with the same keys as `log`.
+
+    Raises:
+        Exception: If a database error occurs.
+    """
+    logged_at = datetime.datetime.now()
+    now = logged_at.strftime("%Y-%m-%d %H:%M:%S.%f")
+    keys = {row["idempotency_key"] for row in rows if row.get("idempotency_key") is not None}
+    try:
+        # Resolved before the transaction, which must not wait on another connection.
+        for row in rows:
+            get_course_code(row.get("class_id", current_class_id))
+        with db_cursor() as cursor:
+            if keys:
+                # Only rows whose key is claimed here, once each, are inserted.
+                claimed = {key for (key,) in psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    INSERT INTO attendance_idempotency_keys (idempotency_key)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING idempotency_key;
+                    """,
+                    [(key,) for key in keys],
+                    fetch=True,
+                )}
+                candidates = rows
+                rows = []
+                for row in candidates:
+                    key = row.get("idempotency_key")
+                    if key is None:
+                        rows.append(row)
+                    elif key in claimed:
+                        claimed.remove(key)
+                        rows.append(row)
+            values = [
+                (row.get("matric_no"), row.get("class_id", current_class_id), row.get("level"),
+                 row.get("dept"), row.get("verified", False), row.get("scan_timestamp", now),
+                 now, row.get("image_filename"), row.get("l2_confidence"), row.get("idempotency_key"))
+                for row in rows
+            ]
+            if values:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    INSERT INTO attendance_log 
+                    (matric_no, class_id, level, department, verified, scan_timestamp, log_timestamp, image_url, confidence,
+                     idempotency_key)
+                    VALUES %s;
+                    """,
+                    values,
+                )
+            events = [attendance_event(row, logged_at) for row in rows]
+            if live.LIVE_FEED_NOTIFY:
+                live.notify(cursor, events)
+    except psycopg2.Error as e:
+        raise Exception(f"Database error: {e}")
+    if not live.LIVE_FEED_NOTIFY:
+        for event in events:
+            attendance_feed.publish(event)
+
+
+def get_class_roster(class_id: int) -> tuple[list[dict], np.ndarray]:
+    """
+    Get the enrolled students of a class and their face embeddings.
+
+    Students are on the roster of a class when their department and level
+    match the class.
+
+    Args:
+        class_id (int): The class ID.
+
+    Returns:
+        tuple[list[dict], np.ndarray]: The students (matric_no, level, dept)
+        and a (students x 128) matrix of their embeddings, in the same order.
+    """
+    with db_cursor() as cursor:
+        cursor.execute(
             """
-            INSERT INTO attendance_log 
-            (matric_no, class_id, level, department, verified, scan_timestamp, log_timestamp, image_url, confidence)
-            VALUES 
-            (%(matric_no)s, %(class_id)s, %(level)s, %(dept)s, %(verified)s, %(scan_timestamp)s, %(log_timestamp)s, %(image_url)s, %(l2_confidence)s);
+            SELECT s.matric_no, s.level, d.code, s.face_embed::text
+            FROM public.students_biodata s
+            INNER JOIN departments d ON s.department_id = d.id
+            INNER JOIN classes c ON c.dept = d.code AND c.level = s.level
+            WHERE c.id = %s AND s.face_embed IS NOT NULL;
             """,
-            data,
+            (class_id,),
         )
-        pg_db.commit()
+        rows = cursor.fetchall()
+
+    students = [{"matric_no": matric_no, "level": level, "dept": dept}
+                for matric_no, level, dept, _ in rows]
+    embeds = np.array([json.loads(embed) for *_, embed in rows],
+                      dtype=np.float64).reshape(len(rows), -1)
+    return students, embeds
+
+
+def _assign_faces(confidences: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Pair faces with students one-to-one, minimising the total distance.
+
+    Uses the Hungarian algorithm from SciPy when it is installed and a greedy
+    closest-pair-first assignment otherwise.
+
+    Args:
+        confidences (np.ndarray): A (faces x students) distance matrix.
+
+    Returns:
+        list[tuple[int, int]]: (face index, student index) pairs below `THRESHOLD`.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        pairs = []
+        used_faces, used_students = set(), set()
+        for flat in np.argsort(confidences, axis=None):
+            face, student = np.unravel_index(flat, confidences.shape)
+            if confidences[face, student] >= THRESHOLD:
+                break
+            if face not in used_faces and student not in used_students:
+                pairs.append((int(face), int(student)))
+                used_faces.add(face)
+                used_students.add(student)
+        return pairs
+
+    faces, students = linear_sum_assignment(confidences)
+    return [(int(face), int(student)) for face, student in zip(faces, students)
+            if confidences[face, student] < THRESHOLD]
+
+
+def identify_group(capture: Mat, class_id: int | None = None, **data) -> list[dict]:
+    """
+    Identify every face in a classroom capture against the class roster and log attendance.
+
+    All faces are encoded in one pass, compared with the whole roster in a
+    single matrix computation and assigned one-to-one, so two faces can never
+    be logged as the same student.
+
+    Args:
+        capture (Mat): The classroom capture as a NumPy array.
+        class_id (int | None): The class to take attendance for. Defaults to the current class.
+        data (dict): Additional data for logging (scan_timestamp, image_filename).
+
+    Returns:
+        list[dict]: One result per detected face with its `box`
+        (top, right, bottom, left), `matric_no` (None if unmatched),
+        `l2_confidence` and `verified`.
+
+    Raises:
+        No_Face_Detected: If no face is detected in the image.
+    """
+    class_id = class_id or current_class_id
+    face_locations = face_detector.detect(capture, upsample=GROUP_UPSAMPLE)
+    if face_locations == []:
+        raise No_Face_Detected("No face detected")
+
+    face_embeds = np.array(load_models().face_encodings(
+        capture, known_face_locations=face_locations, num_jitters=GROUP_NUM_JITTERS))
+    results = [{"box": list(location), "matric_no": None, "l2_confidence": None, "verified": False}
+               for location in face_locations]
+
+    students, roster_embeds = get_class_roster(class_id)
+    if not students:
+        return results
+
+    # Same measure as the match_face query: SQRT of the L2 distance.
+    squared = (np.sum(face_embeds ** 2, axis=1)[:, None]
+               + np.sum(roster_embeds ** 2, axis=1)[None, :]
+               - 2 * face_embeds @ roster_embeds.T)
+    confidences = np.sqrt(np.sqrt(np.maximum(squared, 0)))
+
+    rows = []
+    for face, student in _assign_faces(confidences):
+        results[face].update(matric_no=students[student]["matric_no"],
+                             l2_confidence=float(confidences[face, student]),
+                             verified=True)
+        rows.append({**data, **students[student], "class_id": class_id, "verified": True,
+                     "l2_confidence": float(confidences[face, student])})
+
+    if rows:
+        log_many(rows)
+    return results
+
+
+def referenced_images(paths: list[str]) -> set[str]:
+    """
+    Find which of the given image paths are referenced by attendance rows.
+
+    Args:
+        paths (list[str]): Image paths, as stored in `attendance_log.image_url`.
+
+    Returns:
+        set[str]: The referenced paths.
+    """
+    if not paths:
+        return set()
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT image_url FROM attendance_log WHERE image_url = ANY(%s)",
+            (list(paths),))
+        return {image_url for image_url, in cursor.fetchall()}
+
+
+def encode_face(capture: Mat, num_jitters: int = 4):
+    """
+    Compute the face encoding of the single face in a capture.
+
+    This is the CPU-bound half of `login` and `register_new_user`. It does
+    not touch the database, so it can be run in a separate process. Captures
+    that fail the quality gate are rejected before the expensive encoding.
+
+    Args:
+        capture (Mat): The face capture as a NumPy array.
+        num_jitters (int): How many times to re-sample the face when encoding.
+
+    Returns:
+        numpy.ndarray: The 128-dimensional face encoding.
+
+    Raises:
+        Poor_Capture_Quality: If the capture is too blurry, dark or bright, or
+            the face is too small or not facing the camera.
+        No_Face_Detected: If no face is detected in the image.
+        Multiple_Faces_Detected: If multiple faces are detected in the image.
+    """
+    quality_gate.check_frame(capture)
+
+    face_locations = face_detector.detect(capture)
+
+    if face_locations == []:
+        raise No_Face_Detected("No face detected")
+
+    elif len(face_locations) > 1:
+        raise Multiple_Faces_Detected("Multiple faces detected")
+
+    landmarks = load_models().face_landmarks(
+        capture, face_locations, model="small")
+    quality_gate.check_face(face_locations[0], landmarks[0])
+
+    return load_models().face_encodings(
+        capture, known_face_locations=face_locations, num_jitters=num_jitters)[0]
+
+
+def match_face(login_user_embed, **data) -> tuple[bool, str, float]:
+    """
+    Match a face encoding against the stored embedding of a user and log the attempt.
+
+    Args:
+        login_user_embed (numpy.ndarray): The face encoding to match.
+        data (dict): Additional data for logging, including `matric_no`.
+
+    Returns:
+        tuple[bool, str, float]: Whether the user was verified, their
+        matriculation number and the L2 distance to their stored embedding.
+
+    Raises:
+        User_Not_Registered: If the user is not found in the database.
+    """
+    try:
+        # TODO: Constrain face search to < 0.6; Get a range of users and confirm if the user is in the range
+        with db_cursor() as cursor:
+            statements.MATCH_FACE.execute(
+                cursor, (repr(list(login_user_embed)), data.get("matric_no")))
+            row = cursor.fetchone()
+
+        if row is None or not any(row):
+            raise User_Not_Registered("User not registered")
+
+        user_id, matric_no, l2_confidence = row
+        print(user_id, matric_no, l2_confidence)
+        data["verified"] = l2_confidence < THRESHOLD
+        data["user_id"] = user_id
+        data["matric_no"] = matric_no
+        data["l2_confidence"] = l2_confidence
+
+        data["class_id"] = current_class_id
+        log(**data)
+        return data["verified"], matric_no, l2_confidence
     except psycopg2.Error as e:
-        pg_db.rollback()
         raise Exception(f"Database error: {e}")
+    except Exception as e:
+        print("Something went wrong", e)
+        raise User_Not_Registered("User not registered")
+
+
+def get_verified_students(class_id: int) -> list[tuple[str, float]]:
+    """
+    Get the students verified in a class so far.
+
+    Args:
+        class_id (int): The class ID.
+
+    Returns:
+        list[tuple[str, float]]: (matric_no, best l2_confidence) per student.
+    """
+    # Classes run on the day they start; bounding log_timestamp lets the
+    # planner skip every older partition of attendance_log.
+    with db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT matric_no, MIN(confidence) FROM attendance_log
+            WHERE class_id = %s AND verified
+                AND log_timestamp >= CURRENT_DATE - INTERVAL '1 day'
+            GROUP BY matric_no;
+            """,
+            (class_id,),
+        )
+        return [(matric_no, float(l2_confidence)) for matric_no, l2_confidence in cursor.fetchall()]
+
+
+def _verified_in_class(class_id: int) -> dict[str, tuple[bool, str, float]]:
+    # The query runs without _verified_lock, so loading one class never stalls
+    # scans in the others; concurrent loads of the same class keep the first.
+    with _verified_lock:
+        if class_id in _verified:
+            _verified.move_to_end(class_id)
+            return _verified[class_id]
+
+    loaded = {matric_no: (True, matric_no, l2_confidence)
+              for matric_no, l2_confidence in get_verified_students(class_id)}
+    with _verified_lock:
+        students = _verified.setdefault(class_id, loaded)
+        _verified.move_to_end(class_id)
+        while len(_verified) > VERIFIED_CLASSES:
+            _verified.popitem(last=False)
+        return students
 
 
-def login(most_recent_capture_arr: Mat, **data) -> str:
+def seed_verified(class_id: int) -> int:
+    """
+    Load the students already verified in a class from the database.
+
+    Args:
+        class_id (int): The class ID.
+
+    Returns:
+        int: The number of students already verified.
+    """
+    with _verified_lock:
+        _verified.pop(class_id, None)
+    return len(_verified_in_class(class_id))
+
+
+def already_verified(class_id: int, matric_no: str | None) -> tuple[bool, str, float] | None:
+    """
+    Get the earlier verdict for a student already verified in a class.
+
+    Args:
+        class_id (int): The class ID.
+        matric_no (str | None): The matriculation number.
+
+    Returns:
+        tuple[bool, str, float] | None: The verdict, or None if the student has
+        not been verified in the class yet, or the class could not be loaded
+        (the scan is then encoded as usual).
+    """
+    global _verified_hits
+    if not class_id or matric_no is None:
+        return None
+    try:
+        students = _verified_in_class(class_id)
+    except psycopg2.Error as e:
+        logging.warning(f"Verified students of class {class_id} not loaded: {e}")
+        return None
+    with _verified_lock:
+        result = students.get(matric_no)
+        _verified_hits += result is not None
+        return result
+
+
+def verified_stats() -> dict:
+    """
+    Report the classes kept in the verified set and the scans it answered.
+
+    Returns:
+        dict: Classes, students and hits.
+    """
+    with _verified_lock:
+        return {"classes": len(_verified),
+                "students": sum(len(students) for students in _verified.values()),
+                "hits": _verified_hits}
+
+
+def _remember_verified(class_id: int, result: tuple[bool, str, float]) -> None:
+    if class_id and result[0]:
+        try:
+            students = _verified_in_class(class_id)
+        except psycopg2.Error as e:
+            logging.warning(f"Verified students of class {class_id} not loaded: {e}")
+            return
+        with _verified_lock:
+            students.setdefault(result[1], result)
+
+
+def login(most_recent_capture_arr: Mat, encoder=None, **data) -> tuple[bool, str, float]:
     """
     Authenticate a user by matching their face encoding.
 
+    A student already verified in the current class, or a near-duplicate of a
+    capture verified for the same user and class within the last few seconds,
+    gets the earlier verdict back without being encoded or logged again.
+
     Args:
         most_recent_capture_arr (Mat): The most recent face capture as a NumPy array.
+        encoder (callable | None): Computes the face encoding of the capture.
+            Defaults to `encode_face`.
         data (dict): Additional data for logging.
 
     Returns:
-        str: The matriculation number of the authenticated user.
+        tuple[bool, str, float]: Whether the user was verified, their
+        matriculation number and the L2 distance to their stored embedding.
 
     Raises:
+        Poor_Capture_Quality: If the capture should be retaken.
         No_Face_Detected: If no face is detected in the image.
         Multiple_Faces_Detected: If multiple faces are detected in the image.
         User_Not_Registered: If the user is not found in the database.
     """
+    class_id = current_class_id
+    frame_hash = frame_cache.dhash(most_recent_capture_arr)
+    cache_scope = (data.get("matric_no"), class_id)
+    if REPEAT_SCAN_CACHE:
+        earlier = already_verified(class_id, data.get("matric_no"))
+        if earlier is not None:
+            return earlier
+
+        cached = result_cache.get(cache_scope, frame_hash)
+        if cached is not None:
+            return cached
+
     login_user_capture = most_recent_capture_arr.copy()
-    login_user_embed = face_recognition.face_encodings(login_user_capture,
-                                                       num_jitters=4)
+    login_user_embed = (encoder or encode_face)(login_user_capture)
+    result = match_face(login_user_embed, **data)
+    result_cache.put(cache_scope, frame_hash, result)
+    _remember_verified(class_id, result)
+    return result
 
-    if login_user_embed == []:
-        raise No_Face_Detected("No face detected")
 
-    elif len(login_user_embed) > 1:
-        raise Multiple_Faces_Detected("Multiple faces detected")
+def login_local(most_recent_capture_arr: Mat, snapshot, journal, **data) -> tuple[bool, str, float]:
+    """
+    Identify a user against a local embedding snapshot, without a database round trip.
 
-    else:
-        login_user_embed = login_user_embed[0]
+    The attempt is appended to the local journal instead of `attendance_log`;
+    the journal syncs it once the database is reachable.
 
-        try:
-            # TODO: Constrain face search to < 0.6; Get a range of users and confirm if the user is in the range
-            pg_cursor.execute(
-                """
-                SELECT id, matric_no, SQRT(face_embed <-> %s) AS l2_confidence FROM public.students_biodata 
-                WHERE matric_no = '%s'
-                ORDER BY l2_confidence ASC
-                LIMIT 1;
-                """,
-                (repr(list(login_user_embed)), data.get("matric_no")),
-            )
+    Args:
+        most_recent_capture_arr (Mat): The most recent face capture as a NumPy array.
+        snapshot (snapshot.EmbeddingSnapshot): The local embeddings to search.
+        journal (journal.AttendanceJournal): Where the attempt is recorded.
+        data (dict): Additional data for logging.
 
-            user_id, matric_no, l2_confidence = pg_cursor.fetchone()
-            if not any([user_id, matric_no, l2_confidence]):
-                raise User_Not_Registered("User not registered")
-
-            print(user_id, matric_no, l2_confidence)
-            data["verified"] = l2_confidence < THRESHOLD
-            data["user_id"] = user_id
-            data["matric_no"] = matric_no
-            data["l2_confidence"] = l2_confidence
-            
-            data["class_id"] = current_class_id
-            log(**data)
-            return data["verified"], matric_no, l2_confidence
-        except psycopg2.Error as e:
-            pg_db.rollback()
-            raise Exception(f"Database error: {e}")
-        except Exception as e:
-            print("Something went wrong", e)
-            raise User_Not_Registered("User not registered")
+    Returns:
+        tuple[bool, str, float]: Whether the user was verified, their
+        matriculation number and the L2 distance to their stored embedding.
+
+    Raises:
+        Poor_Capture_Quality: If the capture should be retaken.
+        No_Face_Detected: If no face is detected in the image.
+        Multiple_Faces_Detected: If multiple faces are detected in the image.
+        User_Not_Registered: If the snapshot has no enrolled faces.
+    """
+    login_user_embed = encode_face(most_recent_capture_arr.copy())
+    matric_no, l2_confidence = snapshot.identify(login_user_embed)
 
+    data["matric_no"] = matric_no
+    data["verified"] = l2_confidence < THRESHOLD
+    data["l2_confidence"] = l2_confidence
+    data["class_id"] = current_class_id
+    data["scan_timestamp"] = data.get(
+        "scan_timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    # A batch resent after a crash must not insert its rows twice.
+    data["idempotency_key"] = data.get("idempotency_key", str(uuid.uuid4()))
+    journal.append(**data)
+    return data["verified"], matric_no, l2_confidence
 
-def register_new_user(register_new_user_saved_capture: Mat = None, face_flag: bool = False, **biodata) -> None:
+
+def search_faces(face_embed, k: int = IDENTIFY_TOP_K, ef_search: int | None = None,
+                 probes: int | None = None) -> list[dict]:
     """
-    Register a new user in the system.
+    Find the enrolled students closest to a face encoding, using the vector index.
 
     Args:
-        register_new_user_saved_capture (Mat): The face capture as a NumPy array.
-        face_flag (bool): Whether to register the face encoding.
-        biodata (dict): User biodata.
+        face_embed (numpy.ndarray): The face encoding.
+        k (int): The number of candidates to return.
+        ef_search (int | None): HNSW candidate list size for this search. Raised
+            to `k` if smaller, since HNSW cannot return more rows than it.
+        probes (int | None): IVFFlat lists to probe for this search.
+
+    Returns:
+        list[dict]: Up to `k` candidates (matric_no, l2_confidence, verified), closest first.
+    """
+    k = int(k)
+    with db_cursor() as cursor:
+        # SET LOCAL cannot take parameters; set_config(..., true) is its equivalent.
+        if ef_search is not None:
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                           (str(max(int(ef_search), k)),))
+        if probes is not None:
+            cursor.execute("SELECT set_config('ivfflat.probes', %s, true)",
+                           (str(int(probes)),))
+        statements.IDENTIFY_FACE.execute(cursor, (repr(list(face_embed)), k))
+        rows = cursor.fetchall()
+
+    return [{"matric_no": matric_no,
+             "l2_confidence": l2_confidence,
+             "verified": l2_confidence < THRESHOLD}
+            for _, matric_no, l2_confidence in rows]
+
+
+def identify_face(capture: Mat, k: int = IDENTIFY_TOP_K, ef_search: int | None = None,
+                  probes: int | None = None, encoder=None, snapshot=None, **data) -> list[dict]:
+    """
+    Identify the face in a capture among all enrolled students and log the best match.
+
+    Unlike `login`, no matric number is needed: the capture is searched against
+    every enrolled face through the vector index on `students_biodata.face_embed`
+    (`migrations/002_face_embed_hnsw_index.sql`), or through a memory-mapped
+    embedding snapshot if one is given.
+
+    Args:
+        capture (Mat): The face capture as a NumPy array.
+        k (int): The number of candidates to return.
+        ef_search (int | None): HNSW search breadth for this request.
+        probes (int | None): IVFFlat lists to probe for this request.
+        encoder (callable | None): Computes the face encoding of the capture.
+            Defaults to `encode_face`.
+        snapshot (snapshot.EmbeddingSnapshot | None): Search this instead of the database.
+        data (dict): Additional data for logging.
+
+    Returns:
+        list[dict]: The candidates, closest first.
 
     Raises:
+        Poor_Capture_Quality: If the capture should be retaken.
         No_Face_Detected: If no face is detected in the image.
         Multiple_Faces_Detected: If multiple faces are detected in the image.
-        Invalid_Username: If the username is invalid or empty.
+        User_Not_Registered: If no faces are enrolled.
     """
-    biodata["department"] = get_department_id(biodata.get("dept"))
-    biodata["college"] = get_college_id(biodata.get("college"))
+    face_embed = (encoder or encode_face)(capture.copy())
+    if snapshot is not None:
+        candidates = snapshot.search(face_embed, k)
+    else:
+        candidates = search_faces(face_embed, k, ef_search, probes)
+    if not candidates:
+        raise User_Not_Registered("No enrolled faces")
 
-    if face_flag:
-        new_user_embed = face_recognition.face_encodings(
-            register_new_user_saved_capture, num_jitters=4)
+    best = candidates[0]
+    data["matric_no"] = best["matric_no"]
+    data["verified"] = best["verified"]
+    data["l2_confidence"] = best["l2_confidence"]
+    log(**data)
+    return candidates
 
-        if new_user_embed == []:
-            raise No_Face_Detected("No face detected")
 
-        elif len(new_user_embed) > 1:
-            raise Multiple_Faces_Detected("Multiple faces detected")
+def save_face_embedding(face_embed, **biodata) -> None:
+    """
+    Store the face encoding of a new user.
 
-        biodata["face_embed"] = str(list(new_user_embed[0]))
+    Args:
+        face_embed (numpy.ndarray): The face encoding returned by `encode_face`.
+        biodata (dict): User biodata.
+    """
+    biodata["department"] = get_department_id(biodata.get("dept"))
+    biodata["college"] = get_college_id(biodata.get("college"))
+    biodata["face_embed"] = str(list(face_embed))
 
-        pg_cursor.execute(
+    with db_cursor() as cursor:
+        cursor.execute(
             """
             INSERT INTO public.students_biodata 
             ( level, matric_no, department_id, face_embed)
@@ -277,25 +1015,50 @@ def register_new_user(register_new_user_saved_capture: Mat = None, face_flag: bo
             """,
             biodata,
         )
-    else:
-        if biodata.get("name") is None:
-            raise Invalid_Username("Username cannot be empty")
-
-        if biodata.get("name"):
-            split_names = str(biodata.get("name")).split(" ", 3)
-            if len(split_names) == 1:
-                biodata["first_name"] = split_names[0]
-                biodata["middle_name"] = None
-                biodata["last_name"] = None
-            elif len(split_names) == 2:
-                biodata["first_name"] = split_names[0]
-                biodata["middle_name"] = None
-                biodata["last_name"] = split_names[1]
-            elif len(split_names) == 3:
-                biodata["first_name"] = split_names[0]
-                biodata["middle_name"] = split_names[1]
-                biodata["last_name"] = split_names[2]
-        pg_cursor.execute(
+
+
+def register_new_user(register_new_user_saved_capture: Mat = None, face_flag: bool = False, **biodata) -> None:
+    """
+    Register a new user in the system.
+
+    Args:
+        register_new_user_saved_capture (Mat): The face capture as a NumPy array.
+        face_flag (bool): Whether to register the face encoding.
+        biodata (dict): User biodata.
+
+    Raises:
+        Poor_Capture_Quality: If the capture should be retaken.
+        No_Face_Detected: If no face is detected in the image.
+        Multiple_Faces_Detected: If multiple faces are detected in the image.
+        Invalid_Username: If the username is invalid or empty.
+    """
+    if face_flag:
+        save_face_embedding(
+            encode_face(register_new_user_saved_capture), **biodata)
+        return
+
+    biodata["department"] = get_department_id(biodata.get("dept"))
+    biodata["college"] = get_college_id(biodata.get("college"))
+
+    if biodata.get("name") is None:
+        raise Invalid_Username("Username cannot be empty")
+
+    if biodata.get("name"):
+        split_names = str(biodata.get("name")).split(" ", 3)
+        if len(split_names) == 1:
+            biodata["first_name"] = split_names[0]
+            biodata["middle_name"] = None
+            biodata["last_name"] = None
+        elif len(split_names) == 2:
+            biodata["first_name"] = split_names[0]
+            biodata["middle_name"] = None
+            biodata["last_name"] = split_names[1]
+        elif len(split_names) == 3:
+            biodata["first_name"] = split_names[0]
+            biodata["middle_name"] = split_names[1]
+            biodata["last_name"] = split_names[2]
+    with db_cursor() as cursor:
+        cursor.execute(
             """
             UPDATE public.students_biodata 
             SET
@@ -310,8 +1073,6 @@ def register_new_user(register_new_user_saved_capture: Mat = None, face_flag: bo
             biodata,
         )
 
-    pg_db.commit()
-
 
 def log_class_details(class_details: dict) -> None:
     """
@@ -327,18 +1088,20 @@ def log_class_details(class_details: dict) -> None:
         "start_time").replace(" ", ":00 ")
     class_details["date"] = datetime.datetime.now().strftime("%Y-%m-%d")
     try:
-        pg_cursor.execute(
-            """
-            INSERT INTO classes (course_code, venue, start_time, dept, level, auth_mode, duration, date)
-            VALUES (%(code)s, %(venue)s, %(start_time)s, %(dept)s, %(level)s, %(auth_mode)s, %(duration)s, %(date)s);
-            """,
-            class_details,
-        )
-        pg_db.commit()
+        with db_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO classes (course_code, venue, start_time, dept, level, auth_mode, duration, date)
+                VALUES (%(code)s, %(venue)s, %(start_time)s, %(dept)s, %(level)s, %(auth_mode)s, %(duration)s, %(date)s);
+                """,
+                class_details,
+            )
 
     except psycopg2.Error as e:
-        pg_db.rollback()
         raise Exception(f"Database error: {e}")
     global current_class_id
     current_class_id = get_current_class_id(class_details.get("code"))
+    if current_class_id:
+        _course_codes[current_class_id] = class_details.get("code")
+        seed_verified(current_class_id)
     return current_class_id
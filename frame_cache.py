@@ -0,0 +1,143 @@
+"""
+frame_cache.py
+
+This module implements a short-lived cache of recognition results keyed by a
+perceptual hash of the captured frame. Devices often resend the same capture after
+a dropped connection; a near-duplicate frame seen again within the cache window
+gets the earlier verdict back without being encoded or logged a second time.
+
+Features:
+- 64-bit difference hash (dHash) of a frame, robust to re-compression and small shifts.
+- Near-duplicate lookup by Hamming distance within a scope (e.g. matric number and class).
+- Bounded size with LRU eviction and a time-to-live per entry.
+- Hit, miss and eviction counters.
+
+Dependencies:
+- OpenCV (cv2)
+- NumPy
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+FRAME_CACHE_SIZE = int(os.getenv('FRAME_CACHE_SIZE', 1024))
+FRAME_CACHE_WINDOW = float(os.getenv('FRAME_CACHE_WINDOW', 10))
+FRAME_CACHE_MAX_DISTANCE = int(os.getenv('FRAME_CACHE_MAX_DISTANCE', 6))
+
+
+def dhash(capture: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Compute the difference hash of a BGR or grayscale frame.
+
+    Args:
+        capture (np.ndarray): The frame.
+        hash_size (int): Width and height of the hash grid; the hash has hash_size**2 bits.
+
+    Returns:
+        int: The hash.
+    """
+    gray = capture if capture.ndim == 2 else cv2.cvtColor(capture, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class FrameCache:
+    """
+    An LRU cache of results keyed by (scope, frame hash) that also matches near-duplicate hashes.
+
+    Args:
+        max_entries (int): Maximum number of cached results.
+        window (float): Seconds a result stays valid.
+        max_distance (int): Maximum Hamming distance between two hashes of the same frame.
+    """
+
+    def __init__(self, max_entries: int = FRAME_CACHE_SIZE,
+                 window: float = FRAME_CACHE_WINDOW,
+                 max_distance: int = FRAME_CACHE_MAX_DISTANCE) -> None:
+        self.max_entries = max_entries
+        self.window = window
+        self.max_distance = max_distance
+
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self._scopes: dict[tuple, set[int]] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _remove(self, scope: tuple, frame_hash: int) -> None:
+        self._entries.pop((scope, frame_hash), None)
+        hashes = self._scopes.get(scope)
+        if hashes is not None:
+            hashes.discard(frame_hash)
+            if not hashes:
+                del self._scopes[scope]
+
+    def get(self, scope: tuple, frame_hash: int):
+        """
+        Look up the result of a frame, or of a near-duplicate, in the same scope.
+
+        Args:
+            scope (tuple): What the result is valid for, e.g. (matric_no, class_id).
+            frame_hash (int): The frame's `dhash`.
+
+        Returns:
+            The cached result, or None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for cached_hash in list(self._scopes.get(scope, ())):
+                expires, result = self._entries[(scope, cached_hash)]
+                if expires < now:
+                    self._remove(scope, cached_hash)
+                    continue
+                if (cached_hash ^ frame_hash).bit_count() <= self.max_distance:
+                    self._entries.move_to_end((scope, cached_hash))
+                    self._hits += 1
+                    return result
+            self._misses += 1
+            return None
+
+    def put(self, scope: tuple, frame_hash: int, result) -> None:
+        """
+        Cache the result of a frame.
+
+        Args:
+            scope (tuple): What the result is valid for, e.g. (matric_no, class_id).
+            frame_hash (int): The frame's `dhash`.
+            result: The result to return for near-duplicates of this frame.
+        """
+        with self._lock:
+            self._entries[(scope, frame_hash)] = (time.monotonic() + self.window, result)
+            self._entries.move_to_end((scope, frame_hash))
+            self._scopes.setdefault(scope, set()).add(frame_hash)
+            while len(self._entries) > self.max_entries:
+                (old_scope, old_hash), _ = self._entries.popitem(last=False)
+                self._remove(old_scope, old_hash)
+                self._evictions += 1
+
+    def stats(self) -> dict:
+        """
+        Report cache size and hit rate.
+
+        Returns:
+            dict: Size, limits and counters.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "window": self.window,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
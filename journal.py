@@ -0,0 +1,129 @@
+"""
+journal.py
+
+This module implements the kiosk's local attendance journal. Scans are appended
+to a JSON-lines file and synced to `attendance_log` in batches whenever the
+database is reachable, so a flaky network never blocks a scan or loses a row.
+
+The journal is append-only. The byte offset of the first row not yet synced is
+kept next to it and only advanced after the batch is committed, so a crash
+between the two resends the batch instead of dropping it. Once everything has
+been synced the journal is truncated.
+
+Dependencies:
+- psycopg2 (through face_app, for syncing)
+"""
+
+import json
+import logging
+import os
+import threading
+
+import face_app
+
+JOURNAL_FILE = os.getenv('JOURNAL_FILE', os.path.join(face_app.DB_DIR, 'attendance.journal'))
+JOURNAL_BATCH_SIZE = int(os.getenv('JOURNAL_BATCH_SIZE', 500))
+
+
+class AttendanceJournal:
+    """
+    An append-only local log of attendance rows awaiting sync.
+
+    Args:
+        path (str): The journal file. Its sync offset is kept in `<path>.offset`.
+        batch_size (int): Maximum rows inserted per statement when syncing.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE, batch_size: int = JOURNAL_BATCH_SIZE) -> None:
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def append(self, **row) -> None:
+        """
+        Durably record an attendance row.
+
+        Args:
+            row (dict): Attendance data, with the same keys as `face_app.log`.
+        """
+        line = json.dumps(row, default=str) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset: int) -> None:
+        with open(f"{self.offset_path}.tmp", "w") as f:
+            f.write(str(offset))
+        os.replace(f"{self.offset_path}.tmp", self.offset_path)
+
+    def _read_batch(self, offset: int) -> tuple[list[dict], int]:
+        rows = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while len(rows) < self.batch_size:
+                line = f.readline()
+                # A line without its newline is still being written.
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if line.strip():
+                    rows.append(json.loads(line))
+        return rows, offset
+
+    def pending(self) -> int:
+        """
+        Count the bytes of journal not yet synced.
+
+        Returns:
+            int: Zero when everything has been synced.
+        """
+        with self._lock:
+            try:
+                return os.path.getsize(self.path) - self._read_offset()
+            except FileNotFoundError:
+                return 0
+
+    def sync(self) -> int:
+        """
+        Insert every row not yet synced into the database, in batches.
+
+        Returns:
+            int: The number of rows synced.
+
+        Raises:
+            Exception: If a database error occurs. Rows synced before the error
+            stay synced; the rest are retried on the next call.
+        """
+        synced = 0
+        while True:
+            with self._lock:
+                if not os.path.exists(self.path):
+                    return synced
+                offset = self._read_offset()
+                rows, next_offset = self._read_batch(offset)
+            if not rows:
+                break
+            face_app.log_many(rows)
+            with self._lock:
+                self._write_offset(next_offset)
+            synced += len(rows)
+
+        with self._lock:
+            # Truncate once fully synced, unless a row was appended meanwhile.
+            if os.path.getsize(self.path) == self._read_offset():
+                os.remove(self.path)
+                if os.path.exists(self.offset_path):
+                    os.remove(self.offset_path)
+        if synced:
+            logging.info(f"Synced {synced} journaled attendance rows")
+        return synced
@@ -0,0 +1,199 @@
+"""
+live.py
+
+This module fans attendance events out to the live attendance pages. Each
+process has one `AttendanceFeed`; every open page subscribes to it and gets new
+rows pushed as they are committed, instead of re-running the attendance query on
+every refresh.
+
+Events reach the feed in one of two ways:
+- In-process: `face_app.log` publishes each row once its transaction commits.
+  Enough when attendance is logged by the process serving the pages.
+- LISTEN/NOTIFY (`LIVE_FEED_NOTIFY=True`): `face_app.log` sends a `pg_notify` in
+  the logging transaction, which Postgres delivers on commit, and each process
+  serving pages listens on one dedicated connection. Use this when attendance is
+  logged by other processes (Gunicorn workers, `asgi_server.py`, kiosks).
+
+Either way, hundreds of open pages cost one event stream per process. A page too
+slow to keep up is told to reload instead of holding events without bound, and
+new subscribers get the events of the last `LIVE_FEED_REPLAY` seconds, so a row
+committed while the page was loading is not missed.
+
+Dependencies:
+- psycopg2 (for LISTEN/NOTIFY)
+"""
+
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+LIVE_FEED_NOTIFY = os.getenv('LIVE_FEED_NOTIFY', 'False') == 'True'
+LIVE_FEED_QUEUE = int(os.getenv('LIVE_FEED_QUEUE', 256))
+LIVE_FEED_REPLAY = float(os.getenv('LIVE_FEED_REPLAY', 30))
+
+NOTIFY_CHANNEL = "attendance_log"
+
+
+class Subscription:
+    """
+    One subscriber's bounded queue of events.
+
+    Args:
+        course_code (str | None): Only events of this course are queued; None for all.
+        size (int): Maximum queued events before the subscriber is marked as lagging.
+    """
+
+    def __init__(self, course_code: str | None, size: int) -> None:
+        self.course_code = course_code
+        self.lagged = False
+        self._queue = queue.Queue(maxsize=size)
+
+    def put(self, event: dict) -> None:
+        if self.course_code is not None and event.get("course_code") != self.course_code:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.lagged = True
+
+    def get(self, timeout: float) -> dict | None:
+        """
+        Wait for the next event.
+
+        Returns:
+            dict | None: The event, or None if none arrived within `timeout` seconds.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AttendanceFeed:
+    """
+    An in-process broadcaster of attendance events.
+
+    Args:
+        queue_size (int): Events queued per subscriber before it must reload.
+        replay (float): Seconds of recent events given to each new subscriber.
+    """
+
+    def __init__(self, queue_size: int = LIVE_FEED_QUEUE, replay: float = LIVE_FEED_REPLAY) -> None:
+        self.queue_size = queue_size
+        self.replay = replay
+        self._subscribers: set[Subscription] = set()
+        self._recent: deque[tuple[float, dict]] = deque()
+        self._lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+        self._published = 0
+        self._lagged = 0
+
+    def subscribe(self, course_code: str | None = None) -> Subscription:
+        """
+        Start receiving events, beginning with the recent ones.
+
+        Args:
+            course_code (str | None): Only receive events of this course.
+
+        Returns:
+            Subscription: Pass it to `unsubscribe` when done.
+        """
+        subscription = Subscription(course_code, self.queue_size)
+        with self._lock:
+            self._expire(time.monotonic())
+            for _, event in self._recent:
+                subscription.put(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _expire(self, now: float) -> None:
+        while self._recent and now - self._recent[0][0] > self.replay:
+            self._recent.popleft()
+
+    def publish(self, event: dict) -> None:
+        """
+        Send an event to every subscriber. Never blocks on a slow subscriber.
+
+        Args:
+            event (dict): The attendance event.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._recent.append((now, event))
+            self._expire(now)
+            self._published += 1
+            for subscription in self._subscribers:
+                lagged = subscription.lagged
+                subscription.put(event)
+                self._lagged += subscription.lagged and not lagged
+
+    def _listen_forever(self, connect: Callable) -> None:
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.publish(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                logging.warning(f"Attendance feed listener reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def start_listener(self, connect: Callable) -> None:
+        """
+        Publish the events notified on `NOTIFY_CHANNEL` from a background
+        thread, unless that has already been started.
+
+        Args:
+            connect (Callable): Opens the dedicated database connection to listen on.
+        """
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen_forever, args=(connect,),
+                                                  name="attendance-feed-listener", daemon=True)
+                self._listener.start()
+
+    def stats(self) -> dict:
+        """
+        Report the feed's subscribers and event counts.
+
+        Returns:
+            dict: Subscribers, events published, and subscribers that fell behind.
+        """
+        with self._lock:
+            return {"subscribers": len(self._subscribers),
+                    "published": self._published,
+                    "lagged": self._lagged,
+                    "listening": self._listener is not None}
+
+
+def notify(cursor, events: list[dict]) -> None:
+    """
+    Queue events for every listening process; Postgres delivers them when
+    the cursor's transaction commits, and drops them if it rolls back.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A cursor in the logging transaction.
+        events (list[dict]): The attendance events.
+    """
+    for event in events:
+        cursor.execute("SELECT pg_notify(%s, %s);", (NOTIFY_CHANNEL, json.dumps(event, default=str)))
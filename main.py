@@ -1,13 +1,23 @@
+import logging
+import os
+import threading
+import time
 import tkinter as tk
 import cv2
 from PIL import Image, ImageTk
+import detectors
 import face_app
+import journal
+import snapshot
 import util
 
 scale = 1
 MAIN_WINDOW_GEOMETRY = f'{int(1200*scale)}x{int(520*scale)}+1+10'
 REGISTER_WINDOW_GEOMETRY = f'{int(1200*scale)}x{int(520*scale)}+10+20'
 CAMERA_ID = 0
+SYNC_INTERVAL = 30
+# Webcam frames are small, so the kiosk may use a faster detector than the server.
+FACE_DETECTOR = os.getenv('KIOSK_FACE_DETECTOR', detectors.FACE_DETECTOR)
 
 
 class App():
@@ -28,9 +38,35 @@ class App():
 
         self.add_webcam(self.webcam_label)
 
+        # Load the recognition models while the window comes up.
+        face_app.face_detector = detectors.get_detector(FACE_DETECTOR)
+        face_app.start_warmup()
+
+        # Scans are identified against a local copy of the embeddings and
+        # journaled locally, so the kiosk keeps working when the database is not.
+        self.snapshot = snapshot.EmbeddingSnapshot()
+        self.journal = journal.AttendanceJournal()
+        threading.Thread(target=self.sync_forever, name='kiosk-sync', daemon=True).start()
+
     def run(self) -> None:
         self.main_window.mainloop()
 
+    def sync_forever(self) -> None:
+        """
+        Refresh the embedding snapshot and sync the attendance journal every
+        SYNC_INTERVAL seconds, whenever the database is reachable.
+        """
+        while True:
+            try:
+                self.snapshot.refresh()
+            except Exception as e:
+                logging.warning(f"Snapshot refresh skipped: {e}")
+            try:
+                self.journal.sync()
+            except Exception as e:
+                logging.warning(f"Journal sync skipped: {e}")
+            time.sleep(SYNC_INTERVAL)
+
 
     def add_webcam(self, label:tk.Label) -> None:
         if 'cap' not in self.__dict__:
@@ -63,7 +99,12 @@ class App():
 
     def login(self) -> None:
         try:
-            username = face_app.login(self.most_recent_capture_arr)
+            verified, username, _ = face_app.login_local(self.most_recent_capture_arr,
+                                                         self.snapshot, self.journal)
+
+        except face_app.Poor_Capture_Quality as e:
+            util.msg_box('Retake', f'{e}')
+            return
 
         except face_app.No_Face_Detected:
             util.msg_box('Error', 'No face detected')
@@ -78,6 +119,9 @@ class App():
             return
         
         else:
+            if not verified:
+                util.msg_box('Error', 'User not registered')
+                return
             util.msg_box('Success', f'User {username} was logged in successfully')
             return
         
@@ -0,0 +1,213 @@
+"""
+maintenance.py
+
+Maintenance job for the monthly partitions of `attendance_log`
+(`migrations/004_partition_attendance_log.sql`). Run it daily, e.g. from cron:
+
+    python maintenance.py --months-ahead 3 --retention-months 12
+
+Each run:
+- Creates the partitions for the coming months, so inserts never fall into the
+  default partition.
+- Rolls every month older than the retention period (or before `--archive-before`,
+  e.g. the end of a closed term) into `attendance_summary`, one row per student
+  per class, then detaches and drops its partition.
+- Deletes idempotency keys older than `IDEMPOTENCY_KEY_TTL_DAYS`.
+
+Pass `--dry-run` to print the plan without changing anything.
+
+Dependencies:
+- psycopg2 (through face_app)
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import re
+
+import face_app
+
+ATTENDANCE_PARTITIONS_AHEAD = int(os.getenv('ATTENDANCE_PARTITIONS_AHEAD', 3))
+ATTENDANCE_RETENTION_MONTHS = int(os.getenv('ATTENDANCE_RETENTION_MONTHS', 12))
+IDEMPOTENCY_KEY_TTL_DAYS = int(os.getenv('IDEMPOTENCY_KEY_TTL_DAYS', 7))
+
+_PARTITION_NAME = re.compile(r"^attendance_log_p(\d{4})(\d{2})$")
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"attendance_log_p{month:%Y%m}"
+
+
+def list_partitions() -> dict[datetime.date, str]:
+    """
+    Get the monthly partitions of attendance_log.
+
+    Returns:
+        dict[datetime.date, str]: Partition name by the first day of its month.
+    """
+    with face_app.db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            INNER JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            INNER JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'attendance_log';
+            """
+        )
+        names = [name for (name,) in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime.date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partitions(months_ahead: int, dry_run: bool = False) -> list[str]:
+    """
+    Create the partitions from the current month through `months_ahead` months ahead.
+
+    Args:
+        months_ahead (int): How many future months to cover.
+        dry_run (bool): Only report what would be created.
+
+    Returns:
+        list[str]: The partitions created.
+    """
+    existing = list_partitions()
+    this_month = month_start(datetime.date.today())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(this_month, offset)
+        if month in existing:
+            continue
+        name = partition_name(month)
+        created.append(name)
+        if dry_run:
+            continue
+        with face_app.db_cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS public.{name}
+                PARTITION OF public.attendance_log
+                FOR VALUES FROM (%s) TO (%s);
+                """,
+                (month, add_months(month, 1)),
+            )
+    return created
+
+
+def roll_up(before: datetime.date, dry_run: bool = False) -> list[str]:
+    """
+    Summarise and drop every monthly partition that ends on or before a date.
+
+    Each month is rolled up, detached and dropped in one transaction. A class
+    spanning two months is merged into one summary row.
+
+    Args:
+        before (datetime.date): Months ending after this date are kept.
+        dry_run (bool): Only report what would be rolled up.
+
+    Returns:
+        list[str]: The partitions rolled up.
+    """
+    rolled = []
+    for month, name in sorted(list_partitions().items()):
+        if add_months(month, 1) > before:
+            break
+        rolled.append(name)
+        if dry_run:
+            continue
+        with face_app.db_cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO public.attendance_summary
+                (class_id, matric_no, department, level, verified, scans, best_confidence,
+                 first_log_timestamp, last_log_timestamp)
+                SELECT class_id, matric_no, MAX(department), MAX(level), BOOL_OR(verified), COUNT(*),
+                       MIN(confidence), MIN(log_timestamp), MAX(log_timestamp)
+                FROM public.{name}
+                WHERE class_id IS NOT NULL AND matric_no IS NOT NULL
+                GROUP BY class_id, matric_no
+                ON CONFLICT (class_id, matric_no) DO UPDATE SET
+                    verified = attendance_summary.verified OR EXCLUDED.verified,
+                    scans = attendance_summary.scans + EXCLUDED.scans,
+                    best_confidence = LEAST(attendance_summary.best_confidence, EXCLUDED.best_confidence),
+                    first_log_timestamp = LEAST(attendance_summary.first_log_timestamp, EXCLUDED.first_log_timestamp),
+                    last_log_timestamp = GREATEST(attendance_summary.last_log_timestamp, EXCLUDED.last_log_timestamp);
+                """
+            )
+            cursor.execute(f"ALTER TABLE public.attendance_log DETACH PARTITION public.{name};")
+            cursor.execute(f"DROP TABLE public.{name};")
+        logging.info(f"Rolled up {name} into attendance_summary")
+    return rolled
+
+
+def prune_idempotency_keys(ttl_days: int, dry_run: bool = False) -> int:
+    """
+    Delete idempotency keys older than `ttl_days`; no device retries that late.
+
+    Returns:
+        int: The number of keys deleted (or that would be).
+    """
+    with face_app.db_cursor() as cursor:
+        if dry_run:
+            cursor.execute(
+                """
+                SELECT COUNT(*) FROM public.attendance_idempotency_keys
+                WHERE created_at < now() - %s * INTERVAL '1 day';
+                """,
+                (ttl_days,),
+            )
+            return cursor.fetchone()[0]
+        cursor.execute(
+            """
+            DELETE FROM public.attendance_idempotency_keys
+            WHERE created_at < now() - %s * INTERVAL '1 day';
+            """,
+            (ttl_days,),
+        )
+        return cursor.rowcount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--months-ahead", type=int, default=ATTENDANCE_PARTITIONS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=ATTENDANCE_RETENTION_MONTHS,
+                        help="Months of detailed attendance to keep before rolling up.")
+    parser.add_argument("--archive-before", type=datetime.date.fromisoformat,
+                        help="Roll up every month ending on or before this date (YYYY-MM-DD) instead.")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    prefix = "Would " if args.dry_run else ""
+
+    created = create_partitions(args.months_ahead, args.dry_run)
+    logging.info(f"{prefix}create partitions: {', '.join(created) or 'none'}")
+
+    # The current month is never rolled up, whatever the options say.
+    before = min(args.archive_before or add_months(month_start(datetime.date.today()),
+                                                   -args.retention_months),
+                 month_start(datetime.date.today()))
+    rolled = roll_up(before, args.dry_run)
+    logging.info(f"{prefix}roll up partitions ending by {before}: {', '.join(rolled) or 'none'}")
+
+    pruned = prune_idempotency_keys(IDEMPOTENCY_KEY_TTL_DAYS, args.dry_run)
+    logging.info(f"{prefix}delete {pruned} idempotency keys")
+
+
+if __name__ == "__main__":
+    main()
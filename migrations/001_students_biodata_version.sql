@@ -0,0 +1,23 @@
+-- Version every change to students_biodata, so local embedding snapshots can
+-- fetch only the rows that changed since they were built (see snapshot.py).
+
+CREATE SEQUENCE IF NOT EXISTS public.students_biodata_version_seq;
+
+ALTER TABLE public.students_biodata
+    ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL
+    DEFAULT nextval('public.students_biodata_version_seq');
+
+CREATE INDEX IF NOT EXISTS students_biodata_version_idx
+    ON public.students_biodata (version);
+
+CREATE OR REPLACE FUNCTION public.bump_students_biodata_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('public.students_biodata_version_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS students_biodata_version ON public.students_biodata;
+CREATE TRIGGER students_biodata_version
+    BEFORE UPDATE ON public.students_biodata
+    FOR EACH ROW EXECUTE FUNCTION public.bump_students_biodata_version();
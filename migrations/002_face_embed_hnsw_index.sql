@@ -0,0 +1,17 @@
+-- Approximate nearest-neighbour index on the face embeddings, used by 1:N
+-- identification (face_app.identify_face). Requires pgvector 0.5 or later.
+-- Run outside a transaction: CREATE INDEX CONCURRENTLY keeps enrollment open
+-- while the index builds.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS students_biodata_face_embed_hnsw_idx
+    ON public.students_biodata
+    USING hnsw (face_embed vector_l2_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- On pgvector older than 0.5, use IVFFlat instead (build it after the students
+-- are enrolled; lists ~ rows / 1000):
+--
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS students_biodata_face_embed_ivfflat_idx
+--     ON public.students_biodata
+--     USING ivfflat (face_embed vector_l2_ops)
+--     WITH (lists = 100);
@@ -0,0 +1,10 @@
+-- Optional idempotency key sent by devices with a scan, so that a retried
+-- request never inserts a second attendance row. Rows without a key are not
+-- constrained (NULLs are distinct in a unique index).
+-- Run outside a transaction: CREATE INDEX CONCURRENTLY keeps scans flowing.
+
+ALTER TABLE public.attendance_log
+    ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS attendance_log_idempotency_key_idx
+    ON public.attendance_log (idempotency_key);
@@ -0,0 +1,150 @@
+-- Partition attendance_log by month of log_timestamp, so reports over a date
+-- range only read the months they cover, and old months can be rolled up and
+-- dropped whole (see maintenance.py).
+--
+-- A unique index on a partitioned table must include the partition key, and a
+-- retried request is logged with a new log_timestamp, so idempotency keys move
+-- to their own small table instead of a unique index on attendance_log.
+--
+-- Takes an exclusive lock on attendance_log while existing rows are copied;
+-- run it outside lecture hours. Run maintenance.py afterwards (and daily) to
+-- create the partitions for the coming months.
+
+BEGIN;
+
+ALTER TABLE public.attendance_log RENAME TO attendance_log_unpartitioned;
+DROP INDEX IF EXISTS public.attendance_log_idempotency_key_idx;
+
+-- Indexes are recreated below: unique ones must include the partition key.
+CREATE TABLE public.attendance_log
+    (LIKE public.attendance_log_unpartitioned INCLUDING ALL EXCLUDING INDEXES)
+    PARTITION BY RANGE (log_timestamp);
+
+-- One partition per month of existing data, through the next three months.
+DO $$
+DECLARE
+    month DATE := COALESCE(
+        (SELECT date_trunc('month', MIN(log_timestamp))::date FROM public.attendance_log_unpartitioned),
+        date_trunc('month', CURRENT_DATE)::date);
+BEGIN
+    WHILE month <= date_trunc('month', CURRENT_DATE)::date + INTERVAL '3 months' LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS public.%I PARTITION OF public.attendance_log FOR VALUES FROM (%L) TO (%L)',
+            'attendance_log_p' || to_char(month, 'YYYYMM'), month, (month + INTERVAL '1 month')::date);
+        month := (month + INTERVAL '1 month')::date;
+    END LOOP;
+END
+$$;
+
+-- Catches rows outside every monthly partition (e.g. a NULL log_timestamp).
+CREATE TABLE IF NOT EXISTS public.attendance_log_default
+    PARTITION OF public.attendance_log DEFAULT;
+
+INSERT INTO public.attendance_log SELECT * FROM public.attendance_log_unpartitioned;
+
+-- Recreate the old table's indexes. The primary key and unique indexes get
+-- log_timestamp appended, which keeps them unique (e.g. (id, log_timestamp)
+-- for a serial id); unique expression indexes cannot be carried over.
+DO $$
+DECLARE
+    idx RECORD;
+    cols TEXT[];
+BEGIN
+    FOR idx IN
+        SELECT i.indexrelid, i.indisprimary, i.indisunique, i.indexprs IS NOT NULL AS expression,
+               pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        WHERE i.indrelid = 'public.attendance_log_unpartitioned'::regclass
+    LOOP
+        IF NOT idx.indisunique THEN
+            EXECUTE regexp_replace(idx.definition, '^CREATE INDEX \S+ ON \S+',
+                                   'CREATE INDEX ON public.attendance_log');
+        ELSIF idx.expression THEN
+            RAISE NOTICE 'Not recreated on attendance_log: %', idx.definition;
+        ELSE
+            SELECT array_agg(a.attname::TEXT ORDER BY k.ord) INTO cols
+            FROM pg_index i
+            CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+            INNER JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            WHERE i.indexrelid = idx.indexrelid AND k.ord <= i.indnkeyatts;
+            IF NOT 'log_timestamp' = ANY(cols) THEN
+                cols := cols || 'log_timestamp'::TEXT;
+            END IF;
+            IF idx.indisprimary THEN
+                EXECUTE format('ALTER TABLE public.attendance_log ADD PRIMARY KEY (%s)',
+                               (SELECT string_agg(quote_ident(c), ', ') FROM unnest(cols) AS c));
+            ELSE
+                EXECUTE format('CREATE UNIQUE INDEX ON public.attendance_log (%s)',
+                               (SELECT string_agg(quote_ident(c), ', ') FROM unnest(cols) AS c));
+            END IF;
+        END IF;
+    END LOOP;
+END
+$$;
+
+-- The report and roll-up lookups, unless the old table already had them.
+DO $$
+DECLARE
+    col TEXT;
+BEGIN
+    FOREACH col IN ARRAY ARRAY['class_id', 'matric_no'] LOOP
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_index i
+            INNER JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = 'public.attendance_log'::regclass AND a.attname = col
+        ) THEN
+            EXECUTE format('CREATE INDEX attendance_log_%s_idx ON public.attendance_log (%I)', col, col);
+        END IF;
+    END LOOP;
+END
+$$;
+
+-- Idempotency keys of recent requests; maintenance.py prunes old ones.
+CREATE TABLE IF NOT EXISTS public.attendance_idempotency_keys (
+    idempotency_key TEXT PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+INSERT INTO public.attendance_idempotency_keys (idempotency_key)
+SELECT DISTINCT idempotency_key FROM public.attendance_log_unpartitioned
+WHERE idempotency_key IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+-- One row per student per class for months that have been rolled up. Column
+-- types are taken from attendance_log.
+CREATE TABLE IF NOT EXISTS public.attendance_summary AS
+    SELECT class_id, matric_no, department, level, verified,
+           0::INTEGER AS scans,
+           confidence AS best_confidence,
+           log_timestamp AS first_log_timestamp,
+           log_timestamp AS last_log_timestamp
+    FROM public.attendance_log
+    WITH NO DATA;
+
+ALTER TABLE public.attendance_summary ADD PRIMARY KEY (class_id, matric_no);
+
+CREATE INDEX IF NOT EXISTS attendance_summary_first_log_timestamp_idx
+    ON public.attendance_summary (first_log_timestamp);
+CREATE INDEX IF NOT EXISTS attendance_summary_matric_no_idx
+    ON public.attendance_summary (matric_no);
+
+-- Serial sequences are owned by the old table and would be dropped with it.
+DO $$
+DECLARE
+    seq RECORD;
+BEGIN
+    FOR seq IN
+        SELECT d.objid::regclass AS name, a.attname
+        FROM pg_depend d
+        INNER JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        INNER JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.refobjid = 'public.attendance_log_unpartitioned'::regclass AND d.deptype = 'a'
+    LOOP
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY public.attendance_log.%I', seq.name, seq.attname);
+    END LOOP;
+END
+$$;
+
+DROP TABLE public.attendance_log_unpartitioned;
+
+COMMIT;
@@ -0,0 +1,194 @@
+"""
+profiler.py
+
+This module implements an on-demand sampling profiler for live requests. While
+it is switched on, a random fraction of operations (`/recognize`, `/register`,
+each `/command` command) runs under cProfile and the results are aggregated per
+operation, ready to download as a pstats file for snakeviz, flameprof or
+gprof2dot.
+
+Switched off, which is the default, profiling costs one attribute check per
+operation. It can be switched on at start-up with PROFILE_ENABLED=True or at
+runtime through the admin endpoint in server.py.
+
+Only one operation is profiled at a time; samples that would overlap it are
+skipped. On Python 3.12 and later cProfile sees every thread, so a sample can
+include work done concurrently for other requests.
+
+Dependencies:
+- None (standard library only)
+"""
+
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'False') == 'True'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.05))
+
+
+class Profiler:
+    """
+    Samples operations under cProfile and aggregates the results per operation.
+
+    Args:
+        enabled (bool): Whether to start sampling immediately.
+        sample_rate (float): Fraction of operations to profile, between 0 and 1.
+    """
+
+    def __init__(self, enabled: bool = PROFILE_ENABLED,
+                 sample_rate: float = PROFILE_SAMPLE_RATE) -> None:
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats: dict[str, pstats.Stats] = {}
+        self._samples: dict[str, int] = {}
+        self._seconds: dict[str, float] = {}
+        self._skipped = 0
+
+    def configure(self, enabled: bool | None = None, sample_rate: float | None = None) -> None:
+        """
+        Switch profiling on or off, or change the sample rate.
+
+        Args:
+            enabled (bool | None): The new state. Unchanged if None.
+            sample_rate (float | None): The new sample rate. Unchanged if None.
+
+        Raises:
+            ValueError: If the sample rate is not between 0 and 1.
+        """
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("Sample rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def reset(self) -> None:
+        """
+        Discard every aggregated profile.
+        """
+        with self._lock:
+            self._stats.clear()
+            self._samples.clear()
+            self._seconds.clear()
+            self._skipped = 0
+
+    @contextmanager
+    def profile(self, operation: str):
+        """
+        Profile the enclosed block if profiling is on and the block is sampled.
+
+        Args:
+            operation (str): The name the profile is aggregated under.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield
+            return
+        if not self._active.acquire(blocking=False):
+            with self._lock:
+                self._skipped += 1
+            yield
+            return
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            yield
+        finally:
+            profile.disable()
+            self._active.release()
+            # Failed operations are recorded too; they are often the slow ones.
+            self._record(operation, profile, time.perf_counter() - started)
+
+    def _record(self, operation: str, profile: cProfile.Profile, elapsed: float) -> None:
+        with self._lock:
+            if operation in self._stats:
+                self._stats[operation].add(profile)
+            else:
+                self._stats[operation] = pstats.Stats(profile)
+            self._samples[operation] = self._samples.get(operation, 0) + 1
+            self._seconds[operation] = self._seconds.get(operation, 0.0) + elapsed
+
+    def profiled(self, operation: str):
+        """
+        Decorator profiling every sampled call of a function.
+
+        Args:
+            operation (str): The name the profile is aggregated under.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.profile(operation):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def dump(self, operation: str) -> bytes | None:
+        """
+        Export the aggregated profile of an operation in the pstats file format.
+
+        Args:
+            operation (str): The operation name.
+
+        Returns:
+            bytes | None: The profile, loadable with `pstats.Stats(path)`, or None
+            if the operation has not been sampled.
+        """
+        with self._lock:
+            stats = self._stats.get(operation)
+            return None if stats is None else marshal.dumps(stats.stats)
+
+    def summary(self, operation: str, limit: int = 40) -> str | None:
+        """
+        Render the aggregated profile of an operation as text, by cumulative time.
+
+        Args:
+            operation (str): The operation name.
+            limit (int): Number of functions to list.
+
+        Returns:
+            str | None: The report, or None if the operation has not been sampled.
+        """
+        stream = io.StringIO()
+        with self._lock:
+            stats = self._stats.get(operation)
+            if stats is None:
+                return None
+            stats.stream = stream
+            stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def stats(self) -> dict:
+        """
+        Report the profiler state and the samples taken per operation.
+
+        Returns:
+            dict: State, sample rate, and per-operation sample counts and mean time.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "skipped": self._skipped,
+                "operations": {
+                    operation: {
+                        "samples": samples,
+                        "mean_ms": round(self._seconds[operation] / samples * 1000, 3),
+                    }
+                    for operation, samples in self._samples.items()
+                },
+            }
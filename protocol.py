@@ -0,0 +1,111 @@
+"""
+protocol.py
+
+This module implements the framed binary message format of the `/command`
+WebSocket endpoint. A frame carries the command, a request id and the biodata in
+a small JSON header, followed by the JPEG payload, in a single binary WebSocket
+message. Devices can send several frames without waiting; every response carries
+the request id of the frame it answers.
+
+Frame layout (all integers big-endian):
+
+    +-------+---------+------------+-------------+---------+
+    | magic | version | header_len | header      | payload |
+    | "FR"  | u8 (1)  | u16        | JSON, UTF-8 | bytes   |
+    +-------+---------+------------+-------------+---------+
+
+The header must contain `cmd` and `rid`; every other key is passed to the
+command as biodata. Binary messages that do not start with the magic bytes are
+treated as the image of the legacy two-message protocol.
+"""
+
+import json
+import struct
+
+MAGIC = b"FR"
+VERSION = 1
+
+_PREFIX = struct.Struct(">2sBH")
+
+
+class Invalid_Frame(Exception):
+    pass
+
+
+def is_frame(data: bytes) -> bool:
+    """
+    Check whether a binary message is a frame rather than a bare legacy image.
+
+    Args:
+        data (bytes): The binary WebSocket message.
+
+    Returns:
+        bool: True if the message starts with the frame magic bytes.
+    """
+    return data[:len(MAGIC)] == MAGIC
+
+
+def encode_frame(header: dict, payload: bytes = b"") -> bytes:
+    """
+    Build a frame.
+
+    Args:
+        header (dict): The header, including `cmd` and `rid`.
+        payload (bytes): The JPEG image, if any.
+
+    Returns:
+        bytes: The frame.
+    """
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    if len(header_bytes) > 0xFFFF:
+        raise Invalid_Frame("Frame header too large")
+    return _PREFIX.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes + payload
+
+
+def decode_frame(data: bytes) -> tuple[dict, bytes]:
+    """
+    Split a frame into its header and payload.
+
+    Args:
+        data (bytes): The frame.
+
+    Returns:
+        tuple[dict, bytes]: The decoded header and the payload.
+
+    Raises:
+        Invalid_Frame: If the frame is malformed or its header lacks `cmd` or `rid`.
+    """
+    if len(data) < _PREFIX.size:
+        raise Invalid_Frame("Frame too short")
+    magic, version, header_len = _PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise Invalid_Frame("Not a frame")
+    if version != VERSION:
+        raise Invalid_Frame(f"Unsupported frame version {version}")
+
+    header_end = _PREFIX.size + header_len
+    if len(data) < header_end:
+        raise Invalid_Frame("Truncated frame header")
+    try:
+        header = json.loads(data[_PREFIX.size:header_end])
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise Invalid_Frame("Invalid frame header")
+    if not isinstance(header, dict) or "cmd" not in header or "rid" not in header:
+        raise Invalid_Frame("Frame header must contain cmd and rid")
+    return header, data[header_end:]
+
+
+def tag_response(response: str | dict, rid) -> str:
+    """
+    Add the request id to a JSON response.
+
+    Args:
+        response (str | dict): The response, as a dict or a JSON object string.
+        rid: The request id of the frame being answered.
+
+    Returns:
+        str: The JSON response including `rid`.
+    """
+    if isinstance(response, str):
+        response = json.loads(response)
+    return json.dumps({**response, "rid": rid})
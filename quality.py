@@ -0,0 +1,158 @@
+"""
+quality.py
+
+This module implements a cheap quality gate run before face encoding. Blurry,
+dark or washed-out frames, tiny faces and faces turned away from the camera are
+rejected in milliseconds with a reason code, instead of paying for a full
+multi-jitter encoding that would fail or give an unreliable distance.
+
+Features:
+- Frame checks: sharpness (variance of the Laplacian) and mean luminance.
+- Face checks: face box size and head yaw estimated from facial landmarks.
+- Configurable thresholds and per-reason reject counters.
+
+Dependencies:
+- OpenCV (cv2)
+- NumPy
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+QUALITY_MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', 60))
+QUALITY_MIN_LUMINANCE = float(os.getenv('QUALITY_MIN_LUMINANCE', 40))
+QUALITY_MAX_LUMINANCE = float(os.getenv('QUALITY_MAX_LUMINANCE', 220))
+QUALITY_MIN_FACE_SIZE = int(os.getenv('QUALITY_MIN_FACE_SIZE', 80))
+QUALITY_MAX_YAW = float(os.getenv('QUALITY_MAX_YAW', 0.35))
+
+# Frame checks run on a copy scaled to this width so that their cost does
+# not depend on the camera resolution.
+_ANALYSIS_WIDTH = 320
+
+BLURRY = "BLURRY"
+TOO_DARK = "TOO_DARK"
+TOO_BRIGHT = "TOO_BRIGHT"
+FACE_TOO_SMALL = "FACE_TOO_SMALL"
+FACE_NOT_FRONTAL = "FACE_NOT_FRONTAL"
+REASONS = (BLURRY, TOO_DARK, TOO_BRIGHT, FACE_TOO_SMALL, FACE_NOT_FRONTAL)
+
+
+class Poor_Capture_Quality(Exception):
+    def __init__(self, message: str, reason: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # Keep the reason when the exception crosses a process boundary.
+        return (type(self), (str(self), self.reason))
+
+
+class QualityGate:
+    """
+    Frame and face quality checks with reject counters.
+
+    Args:
+        min_sharpness (float): Minimum variance of the Laplacian of the frame.
+        min_luminance (float): Minimum mean grey level (0-255).
+        max_luminance (float): Maximum mean grey level (0-255).
+        min_face_size (int): Minimum side of the face box in pixels.
+        max_yaw (float): Maximum horizontal offset of the nose from the eye midpoint,
+            as a fraction of the distance between the eyes.
+    """
+
+    def __init__(self, min_sharpness: float = QUALITY_MIN_SHARPNESS,
+                 min_luminance: float = QUALITY_MIN_LUMINANCE,
+                 max_luminance: float = QUALITY_MAX_LUMINANCE,
+                 min_face_size: int = QUALITY_MIN_FACE_SIZE,
+                 max_yaw: float = QUALITY_MAX_YAW) -> None:
+        self.min_sharpness = min_sharpness
+        self.min_luminance = min_luminance
+        self.max_luminance = max_luminance
+        self.min_face_size = min_face_size
+        self.max_yaw = max_yaw
+
+        self._lock = threading.Lock()
+        self._passed = 0
+        self._rejected = dict.fromkeys(REASONS, 0)
+
+    def record(self, reason: str | None) -> None:
+        """
+        Count a checked capture.
+
+        Args:
+            reason (str | None): The reject reason, or None if the capture passed.
+        """
+        with self._lock:
+            if reason is None:
+                self._passed += 1
+            else:
+                self._rejected[reason] = self._rejected.get(reason, 0) + 1
+
+    def _reject(self, message: str, reason: str):
+        self.record(reason)
+        raise Poor_Capture_Quality(message, reason)
+
+    def check_frame(self, capture: np.ndarray) -> None:
+        """
+        Reject frames that are too blurry, too dark or too bright.
+
+        Args:
+            capture (np.ndarray): The BGR frame.
+
+        Raises:
+            Poor_Capture_Quality: If the frame fails a check.
+        """
+        gray = capture if capture.ndim == 2 else cv2.cvtColor(capture, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        if width > _ANALYSIS_WIDTH:
+            gray = cv2.resize(gray, (_ANALYSIS_WIDTH, int(height * _ANALYSIS_WIDTH / width)),
+                              interpolation=cv2.INTER_AREA)
+
+        luminance = float(gray.mean())
+        if luminance < self.min_luminance:
+            self._reject("Image too dark", TOO_DARK)
+        if luminance > self.max_luminance:
+            self._reject("Image too bright", TOO_BRIGHT)
+
+        if cv2.Laplacian(gray, cv2.CV_64F).var() < self.min_sharpness:
+            self._reject("Image too blurry", BLURRY)
+
+    def check_face(self, face_location: tuple, landmarks: dict) -> None:
+        """
+        Reject faces that are too small or turned too far from the camera.
+
+        Args:
+            face_location (tuple): The (top, right, bottom, left) face box.
+            landmarks (dict): The face's landmarks from `face_recognition.face_landmarks`
+                (the 5-point "small" model is enough).
+
+        Raises:
+            Poor_Capture_Quality: If the face fails a check.
+        """
+        top, right, bottom, left = face_location
+        if min(bottom - top, right - left) < self.min_face_size:
+            self._reject("Face too small, move closer", FACE_TOO_SMALL)
+
+        left_eye = np.mean(landmarks["left_eye"], axis=0)
+        right_eye = np.mean(landmarks["right_eye"], axis=0)
+        nose = np.mean(landmarks["nose_tip"], axis=0)
+        eye_distance = np.linalg.norm(right_eye - left_eye)
+        if eye_distance:
+            yaw = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance
+            if yaw > self.max_yaw:
+                self._reject("Face the camera directly", FACE_NOT_FRONTAL)
+
+        self.record(None)
+
+    def stats(self) -> dict:
+        """
+        Report how many captures passed and were rejected for each reason.
+
+        Returns:
+            dict: Pass and reject counters.
+        """
+        with self._lock:
+            return {"passed": self._passed, "rejected": dict(self._rejected)}
@@ -5,8 +5,10 @@ This module implements a Flask-based server with WebSocket support for real-time
 
 Features:
 - WebSocket integration for real-time operations.
+- Single-message binary frames with request pipelining on `/command` (see `protocol.py`).
 - REST API endpoints for face recognition and user registration.
 - Integration with the face_app module for database and face recognition operations.
+- On-demand sampling profiler for live operations (see `profiler.py`), controlled from `/admin/profile`.
 - Error handling for common issues like no face detected, multiple faces detected, and unregistered users.
 
 Dependencies:
@@ -18,18 +20,29 @@ Dependencies:
 - PIL (Pillow)
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, send_file, abort
 from flask_sock import Sock
 
 import base64
+import binascii
+import hmac
 import json
 import cv2
 import numpy as np
 from PIL import Image
 from io import BytesIO
 import logging
+import threading
+from concurrent.futures import Future
 import face_app
-from datetime import datetime
+import admission
+import protocol
+import capture_cache
+import live
+import profiler
+import snapshot
+import statements
+from datetime import datetime, timedelta
 from simple_websocket import Server
 import psycopg2
 import psycopg2.extras
@@ -50,6 +63,10 @@ SOCK_PING_INTERVAL = int(os.getenv('SOCK_PING_INTERVAL', 15))
 FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True') == 'True'
 FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))
+CAPTURE_MAX_AGE = int(os.getenv('CAPTURE_MAX_AGE', 86400))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+SNAPSHOT_IDENTIFY = os.getenv('SNAPSHOT_IDENTIFY', 'False') == 'True'
+LIVE_FEED_KEEPALIVE = float(os.getenv('LIVE_FEED_KEEPALIVE', 15))
 
 
 def base64_to_img(base64_str: str) -> np.matrix:
@@ -78,6 +95,356 @@ def base64_to_img(base64_str: str) -> np.matrix:
 
 current_class_id: int = 0
 
+# Every recognition job, from the WebSocket or the REST API, goes through
+# this queue so that bursts are shed instead of exhausting threads.
+recognition_queue = admission.RecognitionQueue()
+
+# Scan captures, sharded per day and pruned in the background.
+captures = capture_cache.CaptureCache(is_referenced=face_app.referenced_images)
+
+# Off unless PROFILE_ENABLED=True or switched on through /admin/profile.
+request_profiler = profiler.Profiler()
+
+# With SNAPSHOT_IDENTIFY=True, 1:N identification searches a memory-mapped
+# embedding snapshot shared by every worker process instead of the database.
+embeddings = snapshot.EmbeddingSnapshot() if SNAPSHOT_IDENTIFY else None
+
+
+def busy_response(e: admission.Server_Busy) -> dict:
+    """
+    Build the structured response sent when a recognition job is shed.
+
+    Args:
+        e (admission.Server_Busy): The rejection raised by the recognition queue.
+
+    Returns:
+        dict: The response body.
+    """
+    return {"status": "BUSY",
+            "body": "Server busy, try again later.",
+            "retry_after": e.retry_after,
+            "verified": False}
+
+
+def retake_response(e: face_app.Poor_Capture_Quality) -> dict:
+    """
+    Build the response asking the device to retake a capture that failed the quality gate.
+
+    Args:
+        e (face_app.Poor_Capture_Quality): The rejection raised by face_app.
+
+    Returns:
+        dict: The response body.
+    """
+    return {"status": "RETAKE",
+            "reason": e.reason,
+            "body": f"{e}",
+            "verified": False}
+
+
+@request_profiler.profiled("verify_face")
+def _verify_capture(image: Image.Image, **biodata):
+    """
+    Save a capture and verify it. Runs on a recognition queue worker.
+    """
+    image.save(biodata["image_filename"])  # Save the image as a JPEG file
+    # Convert the image to a NumPy array and then to BGR format for OpenCV
+    image_arr = np.array(image)
+    image_arr_bgr = cv2.cvtColor(image_arr, cv2.COLOR_RGB2BGR)
+    return face_app.login(image_arr_bgr, **biodata)
+
+
+@request_profiler.profiled("enroll_face")
+def _enroll_capture(image: Image.Image, **biodata):
+    """
+    Enroll the face in a capture and save it. Runs on a recognition queue worker.
+    """
+    # Convert the image to a NumPy array and then to BGR format for OpenCV
+    image_arr = np.array(image)
+    image_arr_bgr = cv2.cvtColor(image_arr, cv2.COLOR_RGB2BGR)
+    face_app.register_new_user(image_arr_bgr, face_flag=True, **biodata)
+    image.save(biodata["image_filename"])  # Save the image as a JPEG file
+    if embeddings is not None:
+        # Publish the new face; the other workers switch to it on their next check.
+        try:
+            embeddings.refresh()
+        except Exception as e:
+            logging.warning(f"Embedding snapshot refresh failed: {e}")
+
+
+def _submit_capture(device_id: str, job, data: bytes, **biodata) -> Future:
+    """
+    Queue a capture job. Decoding and admission failures are returned through the future.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        return recognition_queue.submit(device_id, job, image, **biodata)
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+def submit_enroll(data: bytes, device_id: str, **biodata) -> Future:
+    """
+    Queue the enrollment of a face capture.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Returns:
+        Future: Pass it to `enroll_response` once it is done.
+    """
+    biodata["image_filename"] = f"./static/enrolled/{biodata.get('matric_no', 'face_to_verify')}_{datetime.strftime(datetime.now(), format='%Y%m%d_%H%M%S')}.jpg"
+    return _submit_capture(device_id, _enroll_capture, data, **biodata)
+
+
+def enroll_response(future: Future, **biodata) -> dict:
+    """
+    Build the response to a finished enrollment.
+
+    Args:
+        future (Future): The future returned by `submit_enroll`.
+        biodata (dict): The biodata the enrollment was submitted with.
+
+    Returns:
+        dict: The response body.
+    """
+    try:
+        future.result()
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding enrollment: {e}")
+        return busy_response(e)
+
+    except face_app.Poor_Capture_Quality as e:
+        logging.error(f"Poor capture quality: {e.reason}")
+        return retake_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected"}
+
+    except face_app.Multiple_Faces_Detected:
+        logging.error("Multiple faces detected")
+        return {"status": "ERR", "body": "Multiple faces detected"}
+
+    except Exception as e:
+        logging.error(f"Error processing user: {e}")
+        return {"status": "ERR", "body": f"{e}"}
+
+    logging.info("Face enrollment successful")
+    return {"status": "OK",
+            "body": f"{biodata.get('matric_no')} enrolled successfully"}
+
+
+def submit_verify(data: bytes, device_id: str, **biodata) -> Future:
+    """
+    Queue the verification of a face capture.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        biodata (dict): User biodata including matriculation number and other details.
+
+    Returns:
+        Future: Pass it to `verify_response` once it is done.
+    """
+    biodata["scan_timestamp"] = biodata.get(
+        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    biodata["image_filename"] = captures.path_for(biodata.get('matric_no', 'face_to_verify'))
+    return _submit_capture(device_id, _verify_capture, data, **biodata)
+
+
+def verify_response(future: Future, **biodata) -> dict:
+    """
+    Build the response to a finished verification.
+
+    Args:
+        future (Future): The future returned by `submit_verify`.
+        biodata (dict): The biodata the verification was submitted with.
+
+    Returns:
+        dict: The response body.
+    """
+    try:
+        verified, matric_no, l2_confidence = future.result()
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding scan: {e}")
+        return busy_response(e)
+
+    except face_app.Poor_Capture_Quality as e:
+        logging.error(f"Poor capture quality: {e.reason}")
+        return retake_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected", "verified": False}
+
+    except face_app.Multiple_Faces_Detected:
+        logging.error("Multiple faces detected")
+        return {"status": "ERR", "body": "Multiple faces detected", "verified": False}
+
+    except face_app.User_Not_Registered:
+        logging.error("User not registered")
+        return {"status": "ERR", "body": "User not registered", "verified": False}
+
+    except Exception as e:
+        logging.error(f"Error processing image: {e}")
+        return {"status": "ERR", "body": "Invalid image data."}
+
+    logging.info(f"Face verification successful for {matric_no}")
+    return {"status": "OK" if verified else "ERR",
+            "body": f"{matric_no}",
+            "verified": verified}
+
+
+@request_profiler.profiled("identify_face")
+def _identify_capture(image: Image.Image, **biodata):
+    """
+    Save a capture and identify it among all enrolled students. Runs on a recognition queue worker.
+    """
+    image.save(biodata["image_filename"])  # Save the image as a JPEG file
+    # Convert the image to a NumPy array and then to BGR format for OpenCV
+    image_arr = np.array(image)
+    image_arr_bgr = cv2.cvtColor(image_arr, cv2.COLOR_RGB2BGR)
+    if embeddings is not None:
+        # Started on first use rather than at import, so that it runs in each
+        # worker even when the app is preloaded before forking.
+        embeddings.start_refresher()
+    return face_app.identify_face(image_arr_bgr, snapshot=embeddings, **biodata)
+
+
+def submit_identify(data: bytes, device_id: str, **biodata) -> Future:
+    """
+    Queue the 1:N identification of a face capture.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        biodata (dict): Optional `k`, `ef_search` and `probes`, and details for logging.
+
+    Returns:
+        Future: Pass it to `identify_response` once it is done.
+    """
+    biodata["scan_timestamp"] = biodata.get(
+        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    biodata["image_filename"] = captures.path_for('identify')
+    return _submit_capture(device_id, _identify_capture, data, **biodata)
+
+
+def identify_response(future: Future, **biodata) -> dict:
+    """
+    Build the response to a finished identification.
+
+    Args:
+        future (Future): The future returned by `submit_identify`.
+        biodata (dict): The data the identification was submitted with.
+
+    Returns:
+        dict: The response body, with the candidates closest first.
+    """
+    try:
+        candidates = future.result()
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding identification: {e}")
+        return busy_response(e)
+
+    except face_app.Poor_Capture_Quality as e:
+        logging.error(f"Poor capture quality: {e.reason}")
+        return retake_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected", "verified": False}
+
+    except face_app.Multiple_Faces_Detected:
+        logging.error("Multiple faces detected")
+        return {"status": "ERR", "body": "Multiple faces detected", "verified": False}
+
+    except face_app.User_Not_Registered:
+        logging.error("No enrolled faces")
+        return {"status": "ERR", "body": "User not registered", "verified": False}
+
+    except Exception as e:
+        logging.error(f"Error identifying image: {e}")
+        return {"status": "ERR", "body": f"{e}", "verified": False}
+
+    best = candidates[0]
+    logging.info(f"Face identified as {best['matric_no']}")
+    return {"status": "OK" if best["verified"] else "ERR",
+            "body": best["matric_no"],
+            "verified": best["verified"],
+            "candidates": candidates}
+
+
+@request_profiler.profiled("group_capture")
+def _identify_group_capture(image: Image.Image, **data):
+    """
+    Save a classroom capture and identify every face in it. Runs on a recognition queue worker.
+    """
+    image.save(data["image_filename"])  # Save the image as a JPEG file
+    # Convert the image to a NumPy array and then to BGR format for OpenCV
+    image_arr = np.array(image)
+    image_arr_bgr = cv2.cvtColor(image_arr, cv2.COLOR_RGB2BGR)
+    return face_app.identify_group(image_arr_bgr, **data)
+
+
+def submit_group(data: bytes, device_id: str, **class_data) -> Future:
+    """
+    Queue the identification of every face in a classroom capture.
+
+    Args:
+        data (bytes): The JPEG capture.
+        device_id (str): The device submitting the capture.
+        class_data (dict): Optional `class_id` (defaults to the current class).
+
+    Returns:
+        Future: Pass it to `group_response` once it is done.
+    """
+    class_data["scan_timestamp"] = class_data.get(
+        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    class_data["image_filename"] = captures.path_for(
+        f"group_{class_data.get('class_id', face_app.current_class_id)}")
+    return _submit_capture(device_id, _identify_group_capture, data, **class_data)
+
+
+def group_response(future: Future, **class_data) -> dict:
+    """
+    Build the response to a finished classroom identification.
+
+    Args:
+        future (Future): The future returned by `submit_group`.
+        class_data (dict): The data the capture was submitted with.
+
+    Returns:
+        dict: The response body, with one entry per detected face.
+    """
+    try:
+        faces = future.result()
+
+    except admission.Server_Busy as e:
+        logging.warning(f"Recognition queue busy, shedding group capture: {e}")
+        return busy_response(e)
+
+    except face_app.No_Face_Detected:
+        logging.error("No face detected")
+        return {"status": "ERR", "body": "No face detected"}
+
+    except Exception as e:
+        logging.error(f"Error processing group capture: {e}")
+        return {"status": "ERR", "body": f"{e}"}
+
+    identified = sum(face["verified"] for face in faces)
+    logging.info(f"Group capture: {identified} of {len(faces)} faces identified")
+    return {"status": "OK",
+            "body": f"{identified} of {len(faces)} faces identified",
+            "faces": faces}
+
 
 def enroll_face(ws: Server, **biodata):
     """
@@ -93,37 +460,10 @@ def enroll_face(ws: Server, **biodata):
     logging.info("Enrolling face...")
     data = ws.receive()
 
-
     if isinstance(data, bytes):
-        try:
-            image = Image.open(BytesIO(data))
-            # Convert the image to a NumPy array and then to BGR format for OpenCV
-            image_arr = np.array(image)
-            image_arr_bgr = cv2.cvtColor(image_arr, cv2.COLOR_RGB2BGR)
-            biodata["image_filename"] = f"./static/enrolled/{biodata.get('matric_no', 'face_to_verify')}_{datetime.strftime(datetime.now(), format='%Y%m%d_%H%M%S')}.jpg"
-            image.show()
-            face_app.register_new_user(
-                image_arr_bgr, face_flag=True, **biodata)
-
-        except face_app.No_Face_Detected:
-            logging.error("No face detected")
-            ws.send({"ERR": "No face detected"})
-
-        except face_app.Multiple_Faces_Detected:
-            logging.error("Multiple faces detected")
-            ws.send({"ERR": "Multiple faces detected"})
-
-        except Exception as e:
-            logging.error(f"Error processing user: {e}")
-            ws.send(json.dumps({"status": "ERR",
-                                "body": f"{e}"}))
-
-        else:
-            logging.info("Face enrollment successful")
-            # Save the image as a JPEG file
-            Image.open(BytesIO(data)).save(biodata["image_filename"])
-            ws.send(json.dumps({"status": "OK",
-                                "body": f"{biodata.get('matric_no')} enrolled successfully"}))
+        device_id = biodata.pop("device_id", request.remote_addr)
+        future = submit_enroll(data, device_id, **biodata)
+        ws.send(json.dumps(enroll_response(future, **biodata)))
 
 
 def verify_face(ws: Server, **biodata):
@@ -139,55 +479,66 @@ def verify_face(ws: Server, **biodata):
     """
     logging.info("Verifying face...")
     data = ws.receive()
-    biodata["scan_timestamp"] = biodata.get(
-        "scan_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
     if not isinstance(data, bytes):
         logging.error("Invalid data type received")
         ws.send(json.dumps({"status": "error",
                             "body": "Invalid data type."}))
         return
 
-    try:
-        image = Image.open(BytesIO(data))
-        image.show()
-        biodata["image_filename"] = f"./static/cache/{biodata.get('matric_no', 'face_to_verify')}_{datetime.strftime(datetime.now(), format='%Y%m%d_%H%M%S')}.jpg"
-        image.save(biodata["image_filename"])  # Save the image as a JPEG file
-        # Convert the image to a NumPy array and then to BGR format for OpenCV
-        image_arr = np.array(image)
-        image_arr_bgr = cv2.cvtColor(image_arr, cv2.COLOR_RGB2BGR)
-        verified, matric_no, l2_confidence = face_app.login(image_arr_bgr, **biodata)
+    device_id = biodata.pop("device_id", request.remote_addr)
+    future = submit_verify(data, device_id, **biodata)
+    ws.send(json.dumps(verify_response(future, **biodata)))
 
-    except face_app.No_Face_Detected:
-        logging.error("No face detected")
-        ws.send({"status": "ERR", "body": "No face detected", "verified": False})
 
-    except face_app.Multiple_Faces_Detected:
-        logging.error("Multiple faces detected")
-        ws.send(
-            {"status": "ERR", "body": "Multiple faces detected", "verified": False})
+def identify_face(ws: Server, **biodata):
+    """
+    Identify a face among all enrolled students, without a matriculation number.
 
-    except face_app.User_Not_Registered:
-        logging.error("User not registered")
-        ws.send({"status": "ERR", "body": "User not registered", "verified": False})
+    Args:
+        ws (Server): The WebSocket connection.
+        biodata (dict): Optional `k`, `ef_search` and `probes`, and details for logging.
 
-    except Exception as e:
-        logging.error(f"Error processing image: {e}")
-        # Placeholder for face verification logic
+    Sends:
+        JSON response with the best match and the top-k candidates.
+    """
+    logging.info("Identifying face...")
+    data = ws.receive()
+    if not isinstance(data, bytes):
+        logging.error("Invalid data type received")
         ws.send(json.dumps({"status": "ERR",
-                            "body": "Invalid image data."}))
+                            "body": "Invalid data type."}))
+        return
 
-    else:
-        THRESHOLD = 0.65
-        ws.send(json.dumps({"status": "OK" if verified else "ERR",
-                            "body": f"{matric_no}",
-                            "verified": verified
-                            }
-                           )
-                )
-        logging.info(f"Face verification successful for {matric_no}")
-    return
+    device_id = biodata.pop("device_id", request.remote_addr)
+    future = submit_identify(data, device_id, **biodata)
+    ws.send(json.dumps(identify_response(future, **biodata)))
 
 
+def group_capture(ws: Server, **class_data):
+    """
+    Take attendance for a whole class from one classroom capture received via WebSocket.
+
+    Args:
+        ws (Server): The WebSocket connection.
+        class_data (dict): Optional `class_id` (defaults to the current class).
+
+    Sends:
+        JSON response with the identified faces and their bounding boxes.
+    """
+    logging.info("Identifying classroom capture...")
+    data = ws.receive()
+    if not isinstance(data, bytes):
+        logging.error("Invalid data type received")
+        ws.send(json.dumps({"status": "ERR",
+                            "body": "Invalid data type."}))
+        return
+
+    device_id = class_data.pop("device_id", request.remote_addr)
+    future = submit_group(data, device_id, **class_data)
+    ws.send(json.dumps(group_response(future, **class_data)))
+
+
+@request_profiler.profiled("enroll_user")
 def enroll_user(ws: Server, **biodata):
     """
     Enroll a new user without face data.
@@ -216,6 +567,7 @@ def enroll_user(ws: Server, **biodata):
     return
 
 
+@request_profiler.profiled("start_class")
 def start_class(ws: Server, **class_data) -> None:
     """
     Start a new class session and log its details in the database.
@@ -241,6 +593,7 @@ def start_class(ws: Server, **class_data) -> None:
                             "body": f"Class {current_class_id} started successfully"}))
 
 
+@request_profiler.profiled("log_attendance")
 def log_attendance(ws: Server, **attendance_data):
     """
     Log attendance for a class session.
@@ -268,11 +621,88 @@ def log_attendance(ws: Server, **attendance_data):
 operations = {
     "enroll_face": enroll_face,
     "verify_face": verify_face,
+    "identify_face": identify_face,
+    "group_capture": group_capture,
     "enroll_user": enroll_user,
     "start_class": start_class,
     "log_attendance": log_attendance
 }
 
+# Commands that carry an image. In a frame they are queued and answered when
+# done, so a device can keep several of them in flight.
+framed_operations = {
+    "enroll_face": (submit_enroll, enroll_response),
+    "verify_face": (submit_verify, verify_response),
+    "identify_face": (submit_identify, identify_response),
+    "group_capture": (submit_group, group_response),
+}
+
+
+class _LockedSocket:
+    """
+    Serialises sends on a WebSocket shared by the receive loop and the
+    recognition queue workers answering pipelined frames.
+    """
+
+    def __init__(self, ws: Server) -> None:
+        self.ws = ws
+        self._lock = threading.Lock()
+
+    def receive(self, timeout=None):
+        return self.ws.receive(timeout)
+
+    def send(self, data) -> None:
+        with self._lock:
+            self.ws.send(data)
+
+
+class _FramedSocket:
+    """
+    Tags every response sent by a command with the request id of its frame.
+    """
+
+    def __init__(self, ws: _LockedSocket, rid) -> None:
+        self.ws = ws
+        self.rid = rid
+
+    def receive(self, timeout=None):
+        raise protocol.Invalid_Frame("Framed commands cannot wait for another message")
+
+    def send(self, data) -> None:
+        self.ws.send(protocol.tag_response(data, self.rid))
+
+
+def handle_frame(ws: _LockedSocket, data: bytes) -> None:
+    """
+    Dispatch a framed command.
+
+    Image commands are queued and answered from the recognition queue worker
+    that completes them; the others run immediately.
+
+    Args:
+        ws (_LockedSocket): The WebSocket connection.
+        data (bytes): The frame.
+
+    Raises:
+        protocol.Invalid_Frame: If the frame is malformed.
+    """
+    header, payload = protocol.decode_frame(data)
+    rid = header.pop("rid")
+    operation = header.pop("cmd")
+    logging.info({"parsed_frame": header, "cmd": operation, "rid": rid})
+
+    if operation in framed_operations:
+        submit, respond = framed_operations[operation]
+        device_id = header.pop("device_id", request.remote_addr)
+        future = submit(payload, device_id, **header)
+        future.add_done_callback(
+            lambda done: ws.send(protocol.tag_response(respond(done, **header), rid)))
+    elif operation in operations:
+        operations[operation](_FramedSocket(ws, rid), **header)
+    else:
+        ws.send(protocol.tag_response({"status": "ERR",
+                                       "body": "Invalid command."}, rid))
+
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
@@ -350,6 +780,8 @@ def attendance():
     Returns:
         - Renders `index.html` with the attendance data if records are found.
         - Renders `index.html` with a message indicating no data if no records are found.
+        - For today's date the page also follows `/attendance/stream` for new records,
+          so it is rendered with an empty table rather than the message.
 
     Raises:
         - psycopg2.DatabaseError: If there is an issue connecting to or querying the database.
@@ -361,7 +793,11 @@ def attendance():
         return render_template('index.html', selected_date=selected_date, course_code=course_code, no_data=True)
     
     selected_date_obj = datetime.strptime(selected_date, '%Y-%m-%d')
-    formatted_date = selected_date_obj.strftime('%Y-%m-%d')
+    # A range on log_timestamp (unlike DATE(log_timestamp) = ...) lets Postgres
+    # read only the partition of that month. Rolled-up months are read from
+    # attendance_summary instead, without capture images.
+    day_start = selected_date_obj
+    day_end = selected_date_obj + timedelta(days=1)
 
     
     conn = psycopg2.connect(
@@ -373,29 +809,66 @@ def attendance():
     )
     cursor = conn.cursor()
 
+    report = {"day_start": day_start, "day_end": day_end, "course_code": course_code}
     if course_code == "None" or course_code is None:
-        cursor.execute("""
-                       SELECT a.matric_no, a.department, a.level, TO_CHAR(log_timestamp, 'HH12:MI:SS AM'), a.verified, a.image_url 
-                       FROM attendance_log a
-                       LEFT JOIN classes ON a.class_id = classes.id
-                       WHERE DATE(log_timestamp) = %s
-                       """, (formatted_date,))
+        cursor.execute(statements.ATTENDANCE_REPORT_SQL, report)
     else:
-        cursor.execute("""
-                        SELECT a.matric_no, a.department, a.level, TO_CHAR(log_timestamp, 'HH12:MI:SS AM'), a.verified, a.image_url 
-                        FROM attendance_log a
-                        INNER JOIN classes ON a.class_id = classes.id
-                        WHERE DATE(log_timestamp) = %s
-                            AND course_code = %s
-                        """, (formatted_date, course_code))
-        
+        cursor.execute(statements.ATTENDANCE_REPORT_BY_COURSE_SQL, report)
+
     attendance_data = cursor.fetchall()
     conn.close()
 
-    if not attendance_data:
+    live_feed = selected_date_obj.date() == datetime.now().date()
+    if not attendance_data and not live_feed:
         return render_template('index.html', selected_date=selected_date, course_code=course_code, no_data=True)
 
-    return render_template('index.html', selected_date=selected_date, course_code=course_code, attendance_data=attendance_data)
+    return render_template('index.html', selected_date=selected_date, course_code=course_code,
+                           attendance_data=attendance_data, live_feed=live_feed)
+
+
+@app.route('/attendance/stream')
+def attendance_stream():
+    """
+    Stream new attendance records as Server-Sent Events.
+
+    Every open stream subscribes to the process's attendance feed, so open
+    pages cost no database queries. Events are the records logged from now on
+    (plus the last few seconds), as JSON with the columns of the attendance
+    table. A `reload` event tells a page that fell behind to reload.
+
+    Request Parameters:
+        - course_code (str, optional): Only stream records of this course.
+
+    Returns:
+        Response: A `text/event-stream` response that stays open.
+    """
+    course_code = request.args.get('course_code')
+    if course_code in ("", "None"):
+        course_code = None
+    if live.LIVE_FEED_NOTIFY:
+        face_app.attendance_feed.start_listener(face_app.connect)
+    subscription = face_app.attendance_feed.subscribe(course_code)
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = subscription.get(timeout=LIVE_FEED_KEEPALIVE)
+                if subscription.lagged:
+                    yield "event: reload\ndata: {}\n\n"
+                    return
+                if event is None:
+                    # Keeps proxies from closing an idle stream, and detects closed pages.
+                    yield ": keepalive\n\n"
+                    continue
+                if event.get("image_url"):
+                    event = {**event, "image_path": capture_path(event["image_url"])}
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        finally:
+            face_app.attendance_feed.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route("/recognize", methods=["POST"])
@@ -413,7 +886,15 @@ def recognize():
     data = request.get_json()
     image_data = data.pop("image_data")
     try:
-        username = face_app.login(base64_to_img(image_data), **data)
+        username = recognition_queue.run(
+            request.remote_addr,
+            request_profiler.profiled("recognize")(lambda: face_app.login(base64_to_img(image_data), **data)))
+
+    except admission.Server_Busy as e:
+        return jsonify(busy_response(e)), 503, {"Retry-After": str(e.retry_after)}
+
+    except face_app.Poor_Capture_Quality as e:
+        return jsonify({"message": f"{e}", "reason": e.reason})
 
     except face_app.No_Face_Detected:
         return jsonify({"message": "No face detected"})
@@ -428,6 +909,76 @@ def recognize():
         return jsonify({"message": f"{username} recognized successfully"})
 
 
+def _image_request() -> tuple[dict, bytes]:
+    """
+    Split a REST request body into its other fields and the decoded `image_data`.
+
+    Returns:
+        tuple[dict, bytes]: The other fields and the image bytes.
+
+    Raises:
+        ValueError: If the body is not a JSON object, or `image_data` is missing
+            or not valid base64.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("image_data"), str):
+        raise ValueError("Expected a JSON object with base64 image_data")
+    try:
+        image = base64.b64decode(data.pop("image_data"))
+    except (binascii.Error, ValueError):
+        raise ValueError("image_data is not valid base64")
+    if not image:
+        raise ValueError("image_data is empty")
+    return data, image
+
+
+@app.route("/identify", methods=["POST"])
+def identify():
+    """
+    REST API endpoint to identify a face among all enrolled students.
+
+    Expects:
+        JSON payload with base64-encoded image data and optional `k` (number of
+        candidates), `ef_search` (HNSW) or `probes` (IVFFlat).
+
+    Returns:
+        JSON response with the best match and the top-k candidates, or a 400
+        error if the image is missing or not valid base64.
+    """
+    try:
+        data, image = _image_request()
+    except ValueError as e:
+        return jsonify({"status": "ERR", "body": f"{e}"}), 400
+    future = submit_identify(image, request.remote_addr, **data)
+    response = identify_response(future, **data)
+    if response["status"] == "BUSY":
+        return jsonify(response), 503, {"Retry-After": str(response["retry_after"])}
+    return jsonify(response)
+
+
+@app.route("/recognize_group", methods=["POST"])
+def recognize_group():
+    """
+    REST API endpoint to take attendance for a whole class from one classroom photo.
+
+    Expects:
+        JSON payload with base64-encoded image data and an optional `class_id`.
+
+    Returns:
+        JSON response with one entry per detected face, including its bounding box,
+        or a 400 error if the image is missing or not valid base64.
+    """
+    try:
+        data, image = _image_request()
+    except ValueError as e:
+        return jsonify({"status": "ERR", "body": f"{e}"}), 400
+    future = submit_group(image, request.remote_addr, **data)
+    response = group_response(future, **data)
+    if response["status"] == "BUSY":
+        return jsonify(response), 503, {"Retry-After": str(response["retry_after"])}
+    return jsonify(response)
+
+
 @app.route("/register", methods=["POST"])
 def register():
     """
@@ -444,7 +995,10 @@ def register():
     image_data = data.pop("image_data")
 
     try:
-        face_app.register_new_user(base64_to_img(image_data), **data)
+        with request_profiler.profile("register"):
+            face_app.register_new_user(base64_to_img(image_data), **data)
+    except face_app.Poor_Capture_Quality as e:
+        return jsonify({"message": f"{e}", "reason": e.reason})
     except face_app.No_Face_Detected:
         return jsonify({"message": "No face detected"})
     else:
@@ -455,6 +1009,62 @@ def register():
         )
 
 
+@app.template_filter('capture_path')
+def capture_path(image_url: str) -> str:
+    """
+    Template filter mapping a stored `image_url` to its path under `/captures/`.
+    """
+    return captures.relative_path(image_url)
+
+
+@app.route('/captures/<path:image>')
+def capture(image):
+    """
+    Serve a full-size capture.
+
+    Captures can still be downsampled by the capture cache, so they are
+    revalidated with their ETag once `CAPTURE_MAX_AGE` has passed.
+
+    Args:
+        image (str): The capture path relative to the capture cache.
+
+    Returns:
+        The image, or 404 if it does not exist.
+    """
+    path = captures.resolve(image)
+    if path is None:
+        abort(404)
+    captures.touch(path)
+    return send_file(path, mimetype="image/jpeg", conditional=True,
+                     etag=True, max_age=CAPTURE_MAX_AGE)
+
+
+@app.route('/captures/preview/<path:image>')
+def capture_preview(image):
+    """
+    Serve the preview of a capture, generating it on first request.
+
+    A preview never changes once generated, so it is cached by browsers for a year.
+
+    Args:
+        image (str): The capture path relative to the capture cache.
+
+    Returns:
+        The preview image, or 404 if the capture does not exist.
+    """
+    path = captures.resolve(image)
+    if path is None:
+        abort(404)
+    # The attendance pages only load previews, so viewing one counts as a use
+    # of the capture for the cache's eviction order.
+    captures.touch(path)
+    response = send_file(captures.preview_for(path), mimetype="image/jpeg",
+                         conditional=True, etag=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @app.route('/student/<student_id>', methods=['GET'])
 def student_page(student_id):
     """
@@ -499,8 +1109,15 @@ def student_page(student_id):
                    FROM attendance_log a
                    INNER JOIN classes c ON a.class_id = c.id
                    WHERE a.matric_no = %s AND c.date IS NOT NULL
-                   ORDER BY c.date DESC
-                   """, (student_id,))
+                   UNION ALL
+                   SELECT c.date, c.course_code,
+                          CASE WHEN s.verified THEN 'Present' ELSE 'Absent' END AS status,
+                          TO_CHAR(first_log_timestamp, 'HH12:MI:SS AM') AS time
+                   FROM attendance_summary s
+                   INNER JOIN classes c ON s.class_id = c.id
+                   WHERE s.matric_no = %s AND c.date IS NOT NULL
+                   ORDER BY date DESC
+                   """, (student_id, student_id))
 
     student_records = cursor.fetchall()
     conn.close()
@@ -509,6 +1126,110 @@ def student_page(student_id):
     return render_template('student_page.html', student_name=student_name, student_records=student_records, no_data=False, student_id=student_id)
 
 
+@app.route('/stats')
+def stats():
+    """
+    Report runtime statistics for the recognition pipeline.
+
+    Returns:
+        JSON response with queue depth, shed counts, cache hit rates
+        (duplicate frames and students already verified),
+        quality gate rejects, capture cache size, profiler samples, the
+        face detector in use and live attendance feed subscribers.
+    """
+    return jsonify({"admission": recognition_queue.stats(),
+                    "frame_cache": face_app.result_cache.stats(),
+                    "verified": face_app.verified_stats(),
+                    "quality": face_app.quality_gate.stats(),
+                    "capture_cache": captures.stats(),
+                    "profiler": request_profiler.stats(),
+                    "detector": face_app.face_detector.name,
+                    "live_feed": face_app.attendance_feed.stats()})
+
+
+def _require_admin() -> None:
+    """
+    Reject the request unless it carries ADMIN_TOKEN in the X-Admin-Token header.
+    Admin endpoints are disabled when ADMIN_TOKEN is not set.
+    """
+    token = request.headers.get('X-Admin-Token')
+    if not ADMIN_TOKEN or token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        abort(403)
+
+
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """
+    Inspect or control the sampling profiler.
+
+    GET reports the profiler state and the samples taken per operation. POST
+    takes a JSON body with `enabled` and/or `sample_rate`. DELETE discards the
+    aggregated profiles.
+
+    Returns:
+        JSON response with the profiler state.
+    """
+    _require_admin()
+    if request.method == 'POST':
+        settings = request.get_json(silent=True) or {}
+        try:
+            request_profiler.configure(enabled=settings.get("enabled"),
+                                       sample_rate=settings.get("sample_rate"))
+        except (TypeError, ValueError) as e:
+            return jsonify({"message": f"{e}"}), 400
+        logging.info(f"Profiler configured: {request_profiler.stats()}")
+    elif request.method == 'DELETE':
+        request_profiler.reset()
+    return jsonify(request_profiler.stats())
+
+
+@app.route('/admin/profile/<operation>')
+def admin_profile_download(operation):
+    """
+    Download the aggregated profile of an operation.
+
+    Query Parameters:
+        - format (str): `pstats` (default), a file for snakeviz, flameprof or
+          gprof2dot, or `text` for a summary sorted by cumulative time.
+
+    Args:
+        operation (str): E.g. `verify_face`, `recognize` or `register`.
+
+    Returns:
+        The profile, or 404 if the operation has not been sampled.
+    """
+    _require_admin()
+    if request.args.get('format') == 'text':
+        summary = request_profiler.summary(operation)
+        if summary is None:
+            abort(404)
+        return summary, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+    dump = request_profiler.dump(operation)
+    if dump is None:
+        abort(404)
+    return send_file(BytesIO(dump), mimetype="application/octet-stream",
+                     as_attachment=True, download_name=f"{operation}.pstats")
+
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness probe.
+
+    Starts warming up the face recognition models if that has not happened yet,
+    so the first probe after a (re)start also triggers initialisation.
+
+    Returns:
+        JSON response with the model and database status; HTTP 503 until both are ready.
+    """
+    face_app.start_warmup()
+    status = {"models": face_app.models_ready(),
+              "database": face_app.database_ready()}
+    status["ready"] = status["models"] and status["database"]
+    return jsonify(status), 200 if status["ready"] else 503
+
+
 @app.route('/about')
 def about():
     """
@@ -528,13 +1249,15 @@ def command(ws: Server):
         ws (Server): The WebSocket connection.
 
     Handles:
-        - JSON commands for operations.
-        - Binary data for image processing.
+        - JSON commands for operations, followed by the image for image commands.
+        - Binary frames carrying a command and its image in one message (see
+          `protocol.py`). Frames may be pipelined; responses carry their `rid`.
 
     Sends:
         JSON response indicating success or error.
     """
     logging.info("WebSocket connection established.")
+    ws = _LockedSocket(ws)
     while True:
         data = ws.receive()
         try:
@@ -550,7 +1273,10 @@ def command(ws: Server):
                 else:
                     ws.send(json.dumps({"status": "ERR",
                                         "body": "Invalid command."}))
-    
+
+            elif isinstance(data, bytes) and protocol.is_frame(data):
+                handle_frame(ws, data)
+
             else:
                 ws.send(json.dumps({"status": "ERR",
                                     "body": "Unsupported data type."}))
@@ -558,6 +1284,10 @@ def command(ws: Server):
             logging.error(f"JSON decode error: {e}")
             ws.send(json.dumps({"status": "ERR",
                                 "body": "Invalid JSON data."}))
+        except protocol.Invalid_Frame as e:
+            logging.error(f"Invalid frame: {e}")
+            ws.send(json.dumps({"status": "ERR",
+                                "body": f"Invalid frame: {e}"}))
         except Exception as e:
             logging.error(f"Error processing data: {e}")
             ws.send(json.dumps({"status": "ERR",
@@ -565,4 +1295,5 @@ def command(ws: Server):
 
 
 if __name__ == "__main__":
+    face_app.start_warmup()
     app.run(debug=FLASK_DEBUG, host=FLASK_HOST, port=FLASK_PORT)
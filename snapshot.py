@@ -0,0 +1,345 @@
+"""
+snapshot.py
+
+This module keeps an on-disk snapshot of the enrolled face embeddings that can be
+memory-mapped read-only, so identification needs no database round trip and
+every process on a machine (kiosk, Gunicorn workers) shares one physical copy
+through the page cache.
+
+Layout of the snapshot directory:
+- `v<version>/embeddings.npy`: a (students x 128) float32 matrix.
+- `v<version>/index.json`: the matric number of each row and the version, i.e.
+  the highest `students_biodata.version` the snapshot contains.
+- `CURRENT`: the name of the newest complete version directory.
+
+Version directories are named after the version and the time they were built,
+so a full rebuild at an unchanged version still replaces the previous one.
+
+A version directory is written under a temporary name and renamed into place,
+and `CURRENT` is replaced atomically, so readers only ever see complete
+snapshots. Readers check `CURRENT` every few seconds and switch to a newer
+version by mapping it and swapping one reference: no copying, no pause. The
+previous versions are kept for a while for readers still mapping them.
+
+Refreshing fetches only the rows whose version is newer than the snapshot
+(`migrations/001_students_biodata_version.sql` adds the column), less a window
+of `SNAPSHOT_VERSION_OVERLAP` versions. A version is drawn from a sequence
+when a row is written, not when its transaction commits, so a row can become
+visible after rows with higher versions. Re-reading the window catches those
+rows; only rows that actually differ from the snapshot produce a new version.
+Every `SNAPSHOT_REBUILD_INTERVAL` seconds the snapshot is rebuilt from every
+row instead. This bounds how long a row missed by the window stays missing,
+and removes students deleted from the database.
+
+Dependencies:
+- NumPy
+- psycopg2 (through face_app, for refreshing)
+"""
+
+import itertools
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import face_app
+
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(face_app.DB_DIR, 'snapshot'))
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', 2))
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv('SNAPSHOT_REFRESH_INTERVAL', 60))
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv('SNAPSHOT_KEEP_VERSIONS', 3))
+SNAPSHOT_VERSION_OVERLAP = int(os.getenv('SNAPSHOT_VERSION_OVERLAP', 1000))
+SNAPSHOT_REBUILD_INTERVAL = float(os.getenv('SNAPSHOT_REBUILD_INTERVAL', 3600))
+
+CURRENT_FILE = "CURRENT"
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.json"
+
+
+def fetch_changes(since_version: int) -> list[tuple[str, np.ndarray, int]]:
+    """
+    Get the enrolled faces added or changed after a snapshot version.
+
+    Args:
+        since_version (int): The snapshot version; 0 fetches every face.
+
+    Returns:
+        list[tuple[str, np.ndarray, int]]: (matric_no, embedding, version) per row,
+        oldest version first.
+    """
+    with face_app.db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT matric_no, face_embed::text, version
+            FROM public.students_biodata
+            WHERE version > %s AND face_embed IS NOT NULL
+            ORDER BY version;
+            """,
+            (since_version,),
+        )
+        rows = cursor.fetchall()
+    return [(matric_no, np.array(json.loads(embed), dtype=np.float32), version)
+            for matric_no, embed, version in rows]
+
+
+def _version_name(version: int) -> str:
+    # Zero-padded so that names sort in version order, then build time.
+    return f"v{version:012d}-{time.time_ns():020d}"
+
+
+class SnapshotVersion:
+    """
+    One immutable, memory-mapped version of the snapshot.
+    """
+
+    def __init__(self, version: int, matric_nos: list[str], embeddings: np.ndarray) -> None:
+        self.version = version
+        self.matric_nos = matric_nos
+        self.embeddings = embeddings
+        self.rows = {matric_no: row for row, matric_no in enumerate(matric_nos)}
+
+
+_EMPTY = SnapshotVersion(0, [], np.empty((0, 128), dtype=np.float32))
+
+
+class EmbeddingSnapshot:
+    """
+    A memory-mapped, versioned copy of the enrolled face embeddings.
+
+    Args:
+        directory (str): Where the snapshot versions are kept.
+        check_interval (float): Seconds between checks for a newer version.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR,
+                 check_interval: float = SNAPSHOT_CHECK_INTERVAL) -> None:
+        self.directory = directory
+        self.check_interval = check_interval
+        self._current = _EMPTY
+        self._current_name: str | None = None
+        self._checked = 0.0
+        self._rebuilt = time.monotonic()
+        # Refreshes are numbered when they start fetching, so that one which
+        # fetched earlier never publishes over one which fetched later.
+        self._fetches = itertools.count(1)
+        self._published_fetch = 0
+        self._lock = threading.Lock()
+        self._refresher: threading.Thread | None = None
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.current().matric_nos)
+
+    @property
+    def version(self) -> int:
+        return self.current().version
+
+    def _read_current(self) -> str | None:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """
+        Map the version named by `CURRENT`, if it is not the one already mapped.
+
+        Returns:
+            bool: True if a newer version was mapped.
+        """
+        name = self._read_current()
+        if name is None or (self._current_name is not None and name <= self._current_name):
+            return False
+        path = os.path.join(self.directory, name)
+        try:
+            with open(os.path.join(path, INDEX_FILE)) as f:
+                index = json.load(f)
+            embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not map embedding snapshot {name}: {e}")
+            return False
+        # Readers hold on to the SnapshotVersion they started with, so one
+        # assignment switches versions without locking them out.
+        self._current = SnapshotVersion(index["version"], index["matric_no"], embeddings)
+        self._current_name = name
+        return True
+
+    def current(self) -> SnapshotVersion:
+        """
+        Get the newest mapped version, checking `CURRENT` at most every `check_interval` seconds.
+
+        Returns:
+            SnapshotVersion: The version to search.
+        """
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            self.load()
+        return self._current
+
+    def _publish(self, version: int, matric_nos: list[str], embeddings: np.ndarray) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        name = _version_name(version)
+        final_path = os.path.join(self.directory, name)
+        tmp_path = os.path.join(self.directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, EMBEDDINGS_FILE), embeddings)
+        with open(os.path.join(tmp_path, INDEX_FILE), "w") as f:
+            json.dump({"version": version, "matric_no": matric_nos}, f)
+        os.rename(tmp_path, final_path)
+
+        current = self._read_current()
+        if current is None or current < name:
+            tmp_current = os.path.join(self.directory, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+            with open(tmp_current, "w") as f:
+                f.write(name)
+            os.replace(tmp_current, os.path.join(self.directory, CURRENT_FILE))
+        self._remove_old_versions()
+
+    def _remove_old_versions(self) -> None:
+        names = sorted(entry for entry in os.listdir(self.directory)
+                       if entry.startswith("v") and os.path.isdir(os.path.join(self.directory, entry)))
+        current = self._read_current()
+        for name in names[:-SNAPSHOT_KEEP_VERSIONS]:
+            if name != current:
+                # Processes still mapping an old version keep its pages until they
+                # switch; where the OS refuses, it is retried on the next refresh.
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _changed(self, base: SnapshotVersion, latest: dict[str, np.ndarray]) -> list[str]:
+        return [matric_no for matric_no, embed in latest.items()
+                if matric_no not in base.rows
+                or not np.array_equal(base.embeddings[base.rows[matric_no]], embed)]
+
+    def refresh(self, full: bool | None = None) -> int:
+        """
+        Bring the snapshot up to date with the database and publish it to
+        every process sharing the directory.
+
+        Args:
+            full (bool | None): Rebuild from every row, dropping deleted students.
+                Defaults to every `SNAPSHOT_REBUILD_INTERVAL` seconds.
+
+        Returns:
+            int: The number of rows added, changed or removed.
+
+        Raises:
+            psycopg2.Error: If the database cannot be reached.
+        """
+        self._checked = 0.0
+        base = self.current()
+        if full is None:
+            full = time.monotonic() - self._rebuilt >= SNAPSHOT_REBUILD_INTERVAL
+        since = 0 if full else max(0, base.version - SNAPSHOT_VERSION_OVERLAP)
+        fetch = next(self._fetches)
+        # The database round trip and the publish run outside the lock; it
+        # only serialises building the new version in memory.
+        changes = fetch_changes(since)
+
+        with self._lock:
+            if fetch < self._published_fetch:
+                return 0
+            # Possibly newer than the version the fetch started from; the fetched
+            # rows still cover its window, as versions only grow.
+            base = self.current()
+            latest = {matric_no: embed for matric_no, embed, _ in changes}
+            version = max([base.version] + [version for _, _, version in changes])
+            changed = self._changed(base, latest)
+
+            if full:
+                self._rebuilt = time.monotonic()
+                removed = [matric_no for matric_no in base.matric_nos if matric_no not in latest]
+                if not changed and not removed:
+                    return 0
+                matric_nos = list(latest)
+                embeddings = np.array([latest[matric_no] for matric_no in matric_nos],
+                                      dtype=np.float32).reshape(len(matric_nos), base.embeddings.shape[1])
+                changed += removed
+            else:
+                if not changed:
+                    return 0
+                matric_nos = list(base.matric_nos)
+                rows = dict(base.rows)
+                for matric_no in changed:
+                    if matric_no not in rows:
+                        rows[matric_no] = len(matric_nos)
+                        matric_nos.append(matric_no)
+                embeddings = np.zeros((len(matric_nos), base.embeddings.shape[1]), dtype=np.float32)
+                embeddings[:len(base.embeddings)] = base.embeddings
+                for matric_no in changed:
+                    embeddings[rows[matric_no]] = latest[matric_no]
+            self._published_fetch = fetch
+
+        self._publish(version, matric_nos, embeddings)
+        self.load()
+        logging.info(f"Embedding snapshot {'rebuilt' if full else 'refreshed'} at version "
+                     f"{self.version}: {len(changed)} changed, {len(self)} total")
+        return len(changed)
+
+    def _refresh_forever(self, interval: float) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning(f"Embedding snapshot refresh skipped: {e}")
+            time.sleep(interval)
+
+    def start_refresher(self, interval: float = SNAPSHOT_REFRESH_INTERVAL) -> None:
+        """
+        Refresh the snapshot in a background thread every `interval` seconds,
+        unless that has already been started.
+        """
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_forever, args=(interval,),
+                                                   name="snapshot-refresher", daemon=True)
+                self._refresher.start()
+
+    def search(self, embed: np.ndarray, k: int = 1) -> list[dict]:
+        """
+        Find the enrolled students closest to a face encoding.
+
+        Args:
+            embed (numpy.ndarray): The face encoding.
+            k (int): The number of candidates to return.
+
+        Returns:
+            list[dict]: Up to `k` candidates (matric_no, l2_confidence, verified),
+            closest first. Distances are measured like the database query
+            (square root of the L2 distance).
+        """
+        snapshot = self.current()
+        if not snapshot.matric_nos:
+            return []
+        distances = np.linalg.norm(snapshot.embeddings - np.asarray(embed, dtype=np.float32), axis=1)
+        k = min(int(k), len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [{"matric_no": snapshot.matric_nos[row],
+                 "l2_confidence": float(np.sqrt(distances[row])),
+                 "verified": bool(np.sqrt(distances[row]) < face_app.THRESHOLD)}
+                for row in nearest]
+
+    def identify(self, embed: np.ndarray) -> tuple[str, float]:
+        """
+        Find the enrolled student closest to a face encoding.
+
+        Args:
+            embed (numpy.ndarray): The face encoding.
+
+        Returns:
+            tuple[str, float]: The matric number and the distance.
+
+        Raises:
+            face_app.User_Not_Registered: If the snapshot is empty.
+        """
+        candidates = self.search(embed, 1)
+        if not candidates:
+            raise face_app.User_Not_Registered("No enrolled faces in the local snapshot")
+        return candidates[0]["matric_no"], candidates[0]["l2_confidence"]
@@ -0,0 +1,188 @@
+"""
+statements.py
+
+This module implements server-side prepared statements for the SQL on the
+recognition hot path. Each statement is sent to PostgreSQL with PREPARE once per
+pooled connection and then run with EXECUTE, so the server parses and plans it
+only once instead of on every scan.
+
+Features:
+- A registry of named statements shared by every connection.
+- A connection class that remembers which statements it has prepared, so a new
+  connection (for example after a reconnect) prepares them again on first use.
+- Transparent re-preparation if the server has dropped a statement, when it is
+  the first statement of its transaction.
+
+Dependencies:
+- psycopg2
+"""
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """
+    A psycopg2 connection that tracks the statements prepared on it.
+
+    Pass it as the `connection_factory` of a connection or pool.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+class Statement:
+    """
+    A named SQL statement prepared on demand on each connection.
+
+    Args:
+        name (str): The server-side statement name.
+        sql (str): The statement, with `$1`, `$2`, ... placeholders.
+        params (tuple[str, ...]): Names of the parameters in placeholder order,
+            used when the statement is executed with a dict.
+    """
+
+    def __init__(self, name: str, sql: str, params: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.sql = sql
+        self.params = params
+        placeholders = ", ".join(["%s"] * len(params))
+        self._execute_sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+
+    def _args(self, args: tuple | dict) -> tuple:
+        if isinstance(args, dict):
+            return tuple(args.get(param) for param in self.params)
+        return tuple(args)
+
+    def _prepare(self, cursor) -> None:
+        cursor.execute(f"PREPARE {self.name} AS {self.sql}")
+        cursor.connection.prepared.add(self.name)
+
+    def execute(self, cursor, args: tuple | dict = ()) -> None:
+        """
+        Execute the statement on a cursor, preparing it first if needed.
+
+        Args:
+            cursor: A cursor on a `PreparingConnection`.
+            args (tuple | dict): The parameter values, positionally or by name.
+
+        Raises:
+            psycopg2.errors.InvalidSqlStatementName: If the server dropped the
+                statement and it was not the first of the transaction.
+        """
+        conn = cursor.connection
+        values = self._args(args)
+        first = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        if self.name not in conn.prepared:
+            self._prepare(cursor)
+        try:
+            cursor.execute(self._execute_sql, values)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The server forgot the statement (e.g. DISCARD ALL or a rolled
+            # back PREPARE) and the failed EXECUTE aborted the transaction.
+            if not first:
+                # Starting over would silently drop the caller's earlier
+                # statements. Fail the transaction instead, and close the
+                # connection so that the pool replaces it.
+                conn.close()
+                raise
+            conn.rollback()
+            cursor.execute("DEALLOCATE ALL")
+            conn.prepared.clear()
+            self._prepare(cursor)
+            cursor.execute(self._execute_sql, values)
+
+
+MATCH_FACE = Statement(
+    "match_face",
+    """
+    SELECT id, matric_no, SQRT(face_embed <-> $1::vector) AS l2_confidence FROM public.students_biodata
+    WHERE matric_no = $2
+    ORDER BY l2_confidence ASC
+    LIMIT 1
+    """,
+    ("face_embed", "matric_no"),
+)
+
+# Ordering by the bare distance operator (not an expression over it) is what
+# lets the planner use the HNSW/IVFFlat index on face_embed.
+IDENTIFY_FACE = Statement(
+    "identify_face",
+    """
+    SELECT id, matric_no, SQRT(face_embed <-> $1::vector) AS l2_confidence FROM public.students_biodata
+    WHERE face_embed IS NOT NULL
+    ORDER BY face_embed <-> $1::vector
+    LIMIT $2
+    """,
+    ("face_embed", "k"),
+)
+
+LOG_ATTENDANCE = Statement(
+    "log_attendance",
+    """
+    INSERT INTO attendance_log
+    (matric_no, class_id, level, department, verified, scan_timestamp, log_timestamp, image_url, confidence,
+     idempotency_key)
+    VALUES
+    ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+    """,
+    ("matric_no", "class_id", "level", "dept", "verified",
+     "scan_timestamp", "log_timestamp", "image_url", "l2_confidence", "idempotency_key"),
+)
+
+# Returns no row if the key was already claimed, i.e. the request is a retry
+# and must not be logged again (migrations/004_partition_attendance_log.sql).
+CLAIM_IDEMPOTENCY_KEY = Statement(
+    "claim_idempotency_key",
+    """
+    INSERT INTO attendance_idempotency_keys (idempotency_key)
+    VALUES ($1)
+    ON CONFLICT DO NOTHING
+    RETURNING idempotency_key
+    """,
+    ("idempotency_key",),
+)
+
+GET_STUDENT_ID = Statement(
+    "get_student_id",
+    "SELECT id FROM students_biodata WHERE matric_no = $1",
+    ("matric_no",),
+)
+
+GET_CURRENT_CLASS_ID = Statement(
+    "get_current_class_id",
+    "SELECT MAX(id) FROM classes WHERE course_code = $1",
+    ("course_code",),
+)
+
+# The attendance report of `server.attendance`. Plain SQL rather than prepared
+# statements: a plan made for the actual dates lets Postgres prune
+# attendance_log down to the partition of that month, which
+# benchmarks/check_partition_pruning.py checks.
+ATTENDANCE_REPORT_SQL = """
+    SELECT a.matric_no, a.department, a.level, TO_CHAR(log_timestamp, 'HH12:MI:SS AM'), a.verified, a.image_url
+    FROM attendance_log a
+    LEFT JOIN classes ON a.class_id = classes.id
+    WHERE log_timestamp >= %(day_start)s AND log_timestamp < %(day_end)s
+    UNION ALL
+    SELECT s.matric_no, s.department, s.level, TO_CHAR(first_log_timestamp, 'HH12:MI:SS AM'), s.verified, NULL
+    FROM attendance_summary s
+    WHERE first_log_timestamp >= %(day_start)s AND first_log_timestamp < %(day_end)s
+    """
+
+ATTENDANCE_REPORT_BY_COURSE_SQL = """
+    SELECT a.matric_no, a.department, a.level, TO_CHAR(log_timestamp, 'HH12:MI:SS AM'), a.verified, a.image_url
+    FROM attendance_log a
+    INNER JOIN classes ON a.class_id = classes.id
+    WHERE log_timestamp >= %(day_start)s AND log_timestamp < %(day_end)s
+        AND course_code = %(course_code)s
+    UNION ALL
+    SELECT s.matric_no, s.department, s.level, TO_CHAR(first_log_timestamp, 'HH12:MI:SS AM'), s.verified, NULL
+    FROM attendance_summary s
+    INNER JOIN classes ON s.class_id = classes.id
+    WHERE first_log_timestamp >= %(day_start)s AND first_log_timestamp < %(day_end)s
+        AND course_code = %(course_code)s
+    """